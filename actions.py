@@ -2,9 +2,7 @@
 """functions for making changes to a tasks or the task list"""
 import sys
 import datetime
-import readline
 import re
-import copy
 import utils
 import parse
 
@@ -12,14 +10,24 @@ import parse
 def add(tasks, text):
     """add a task"""
     task = parse.Task(text)
-    task.added = datetime.date.today()
-    task.due = datetime.date.today()
+    task.added = utils.today()
+    task.due = utils.today()
     tasks.append(task)
     return tasks
 
 
+def line_editing():
+    """
+    give input line editing and history. readline is only loaded by the
+    commands that prompt, as it is slow to load.
+    """
+    import readline
+    return readline
+
+
 def prefill_input(prompt, prefill):
     """prompt for input with supplied prefill text"""
+    readline = line_editing()
     readline.set_startup_hook(lambda: readline.insert_text(prefill))
     try:
         result = input(prompt)
@@ -36,6 +44,7 @@ def edit(tasks, num):
 
 def remove(tasks, num):
     """remove a task"""
+    line_editing()
     followthrough = input('Task: {}\nDelete? (Y/n)'.format(
         tasks[num].compose_line()))
     if followthrough == '' or followthrough.lower() == 'y':
@@ -54,7 +63,7 @@ def complete(tasks, num):
         tasks = repeat_recycle(tasks, num)
     else:
         tasks[num].x = 'x'
-        tasks[num].done = datetime.date.today()
+        tasks[num].done = utils.today()
     return tasks
 
 
@@ -240,7 +249,7 @@ def repeat_set(tasks, num, string):
     """set a task as repeating, specify repeat type and details in tag"""
     t = tasks[num]
     if t.added is None:
-        t.added = datetime.date.today()
+        t.added = utils.today()
     if re.match(r'a\d{1,2}$', string):
         t.repeat = string
     elif re.match(r'e\d{1,2}$', string):
@@ -259,16 +268,19 @@ def repeat_set(tasks, num, string):
 def repeat_recycle(tasks, num):
     """on completion of repeating task, make new due date and update tag"""
     t = tasks[num]
-    td = datetime.date.today()
+    td = utils.today()
 
+    import copy
     t_done = copy.deepcopy(t)
+    t_done.source = None
+    t_done.uid = None
     t_done.x = 'x'
     t_done.done = td
     tasks.append(t_done)
 
     if 'a' in t.repeat:
         interval = int(t.repeat[1:])
-        t.due = datetime.date.today() + datetime.timedelta(interval)
+        t.due = utils.today() + datetime.timedelta(interval)
     elif 'e' in t.repeat:
         nums = t.repeat[1:].split('c')
         interval = int(nums[0])
@@ -301,8 +313,9 @@ def repeat_recycle(tasks, num):
 
 def catch(tasks):
     """iterate over all tasks due before today and ask for new duedate"""
+    line_editing()
     for i, t in enumerate(tasks):
-        if t.due and t.due < datetime.date.today() and t.x is None:
+        if t.due and t.due < utils.today() and t.x is None:
             sched = input('{}\nNew due date (blank for future): '.format(
                 t.text))
             if sched == '':
@@ -0,0 +1,288 @@
+#!/usr/bin/python
+"""archive of finished tasks split into monthly segment files"""
+
+import os
+import json
+import datetime
+import hashlib
+import collections
+import cache
+import parse
+
+INDEX = 'index.json'
+UNDATED = 'undated'
+# bytes at the end of the counted part of a plain archive file that are
+# compared to tell if it was only appended to since
+TAIL = 4096
+# version of the day counts kept beside a plain archive file
+DAYS_VERSION = 1
+
+
+def date_range(spec):
+    """
+    return the first and last date covered by a year, month or day, or by
+    two of them joined with a colon ('2020', '2020-03', '2020-03-01:2020-04')
+    """
+    if ':' in spec:
+        start, end = spec.split(':', 1)
+        return date_range(start)[0], date_range(end)[1]
+    parts = [int(p) for p in spec.split('-')]
+    if len(parts) == 1:
+        return datetime.date(parts[0], 1, 1), datetime.date(parts[0], 12, 31)
+    if len(parts) == 2:
+        first = datetime.date(parts[0], parts[1], 1)
+        following = (first + datetime.timedelta(32)).replace(day=1)
+        return first, following - datetime.timedelta(1)
+    day = datetime.date(*parts)
+    return day, day
+
+
+def segment_name(task):
+    """return the name of the segment a task is archived in"""
+    return task.done.strftime('%Y-%m') if task.done else UNDATED
+
+
+class ArchiveStore(object):
+    """
+    finished tasks stored in one file per month of completion.
+
+    an index records for each segment the number of tasks, the range of
+    done dates, the number done each day and the projects and contexts it
+    holds, so queries only read the segments that can match.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._index = None
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def stamp(self, name):
+        """return the mtime and size of a segment file"""
+        stat = os.stat(self.path(name + '.txt'))
+        return [stat.st_mtime_ns, stat.st_size]
+
+    @property
+    def index(self):
+        """segment summaries, refreshed for segments changed by hand"""
+        if self._index is None:
+            try:
+                with open(self.path(INDEX)) as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            names = [f[:-4] for f in self.listing() if f.endswith('.txt')]
+            # entries written before days were counted are made again
+            stale = [n for n in names if n not in self._index or
+                     self._index[n]['stamp'] != self.stamp(n) or
+                     'days' not in self._index[n]]
+            gone = [n for n in self._index if n not in names]
+            for name in stale:
+                self._index[name] = self.summarize(name)
+            for name in gone:
+                del self._index[name]
+            if stale or gone:
+                self.save_index()
+        return self._index
+
+    def listing(self):
+        try:
+            return os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+
+    def save_index(self):
+        temp = self.path(INDEX + '.tmp')
+        with open(temp, 'w') as f:
+            json.dump(self._index, f, sort_keys=True)
+        os.replace(temp, self.path(INDEX))
+
+    def summarize(self, name, tasks=None):
+        """return the index entry for a segment"""
+        if tasks is None:
+            tasks = self.read(name)
+        projects = collections.Counter()
+        contexts = collections.Counter()
+        days = collections.Counter()
+        count = 0
+        for t in tasks:
+            count += 1
+            projects.update(t.projects)
+            contexts.update(t.contexts)
+            if t.done:
+                days[t.done.isoformat()] += 1
+        return {'stamp': self.stamp(name), 'count': count,
+                'first': min(days, default=None),
+                'last': max(days, default=None),
+                'days': dict(days),
+                'projects': dict(projects), 'contexts': dict(contexts)}
+
+    def read(self, name):
+        """return the tasks of a segment"""
+        with open(self.path(name + '.txt')) as f:
+            return [parse.Task(l) for l in f]
+
+    def add(self, tasks):
+        """append tasks to the segments of their done dates"""
+        os.makedirs(self.directory, exist_ok=True)
+        index = self.index
+        groups = collections.OrderedDict()
+        for t in tasks:
+            groups.setdefault(segment_name(t), []).append(t)
+        for name, group in groups.items():
+            with open(self.path(name + '.txt'), 'a') as f:
+                for t in group:
+                    f.write(t.compose_line(False, ['n']) + '\n')
+            entry = index.get(name)
+            if entry is None:
+                index[name] = self.summarize(name)
+                continue
+            # extend the entry rather than reading the whole segment again
+            added = self.summarize(name, group)
+            entry['stamp'] = added['stamp']
+            entry['count'] += added['count']
+            for key, pick in (('first', min), ('last', max)):
+                dates = [d for d in (entry[key], added[key]) if d]
+                entry[key] = pick(dates) if dates else None
+            for key in ('days', 'projects', 'contexts'):
+                counts = collections.Counter(entry[key])
+                counts.update(added[key])
+                entry[key] = dict(counts)
+        self.save_index()
+
+    def segments(self, start=None, end=None, projects=None, contexts=None):
+        """
+        return the names of segments that may hold tasks done between
+        start and end and having any of the projects and any of the
+        contexts, in date order
+        """
+        names = []
+        for name, entry in sorted(self.index.items()):
+            if start or end:
+                if entry['first'] is None:
+                    continue
+                if start and entry['last'] < start.isoformat():
+                    continue
+                if end and entry['first'] > end.isoformat():
+                    continue
+            if projects and not any(p in entry['projects']
+                                    for p in projects):
+                continue
+            if contexts and not any(c in entry['contexts']
+                                    for c in contexts):
+                continue
+            names.append(name)
+        return names
+
+    def read_range(self, name, start=None, end=None):
+        """return the tasks of a segment done between start and end"""
+        tasks = self.read(name)
+        if start:
+            tasks = [t for t in tasks if t.done and t.done >= start]
+        if end:
+            tasks = [t for t in tasks if t.done and t.done <= end]
+        return tasks
+
+    def query(self, start=None, end=None, projects=None, contexts=None):
+        """return archived tasks done between start and end, by done date"""
+        tasks = [t for name in self.segments(start, end, projects, contexts)
+                 for t in self.read_range(name, start, end)]
+        tasks.sort(key=lambda t: t.done or datetime.date(1, 1, 1))
+        for i, t in enumerate(tasks):
+            t.num = i+1
+        return tasks
+
+    def report(self, start=None, end=None):
+        """
+        return the number of tasks done between start and end per month,
+        project and context. segments entirely within the range are counted
+        from the index without being read.
+        """
+        months = collections.Counter()
+        projects = collections.Counter()
+        contexts = collections.Counter()
+        for name in self.segments(start, end):
+            entry = self.index[name]
+            if ((not start or entry['first'] and
+                 entry['first'] >= start.isoformat()) and
+                    (not end or entry['last'] and
+                     entry['last'] <= end.isoformat())):
+                months[name] += entry['count']
+                projects.update(entry['projects'])
+                contexts.update(entry['contexts'])
+                continue
+            for t in self.read_range(name, start, end):
+                months[name] += 1
+                projects.update(t.projects)
+                contexts.update(t.contexts)
+        return months, projects, contexts
+
+    def done_days(self, start=None, end=None):
+        """
+        return the number of tasks done each day between start and end, by
+        date string, counted from the index without reading any segment
+        """
+        days = collections.Counter()
+        for name in self.segments(start, end):
+            days.update(self.index[name]['days'])
+        return in_range(days, start, end)
+
+    def import_file(self, location):
+        """move the tasks of a plain archive file into the store"""
+        with open(location) as f:
+            tasks = [parse.Task(l) for l in f if l.strip()]
+        self.add(tasks)
+        os.remove(location)
+        return len(tasks)
+
+
+def in_range(days, start=None, end=None):
+    """keep the counts of days between start and end"""
+    first = start.isoformat() if start else ''
+    last = end.isoformat() if end else '~'
+    return collections.Counter({day: count for day, count in days.items()
+                                if first <= day <= last})
+
+
+def file_done_days(location, start=None, end=None):
+    """
+    return the number of tasks done each day between start and end in a
+    plain archive file, by date string.
+
+    the counts for the whole file are kept beside it along with the length
+    they cover, and only the lines appended since are read. the file is
+    counted again from the start if it was cut short or the end of the
+    part counted has changed.
+    """
+    found, rollup = cache.load_marker(location, 'days', DAYS_VERSION)
+    try:
+        f = open(location, 'rb')
+    except FileNotFoundError:
+        return collections.Counter()
+    with f:
+        days = collections.Counter()
+        length = 0
+        if found:
+            counted, tail, saved = rollup
+            f.seek(max(counted - TAIL, 0))
+            if hashlib.sha1(f.read(min(counted, TAIL))).hexdigest() == tail:
+                days.update(saved)
+                length = counted
+        f.seek(length)
+        data = f.read()
+    # a line still being written is left for the next count
+    data = data[:data.rfind(b'\n') + 1]
+    if data or not found:
+        for line in data.decode(errors='replace').splitlines():
+            if line.strip():
+                done = parse.Task(line).done
+                if done:
+                    days[done.isoformat()] += 1
+        length += len(data)
+        with open(location, 'rb') as f:
+            f.seek(max(length - TAIL, 0))
+            tail = hashlib.sha1(f.read(min(length, TAIL))).hexdigest()
+        cache.save_marker(location, 'days', DAYS_VERSION,
+                          (length, tail, dict(days)))
+    return in_range(days, start, end)
@@ -18,11 +18,7 @@ def encode(num, numerals=BASE62):
 
 def decode(s, numerals=BASE62):
     """decode a base62 number to a decimal"""
-    strlen = len(s)
     num = 0
-    idx = 0
     for char in s:
-        power = strlen - (idx + 1)
-        num += numerals.index(char) * BASE ** power
-        idx += 1
+        num = num * BASE + numerals.index(char)
     return num
@@ -0,0 +1,731 @@
+#!/usr/bin/python
+"""timing comparisons for the hot paths of taskland
+
+run as: benchmark.py [name ...]   (all benchmarks if no name is given)
+"""
+
+import gc
+import os
+import bisect
+import sys
+import shutil
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+import time
+import random
+import datetime
+import collections
+import base62
+import index
+import parse
+import store
+import table
+import utils
+import views
+
+
+def generate_lines(count, seed=0):
+    """generate a reproducible task list of the given length"""
+    rng = random.Random(seed)
+    words = ['call', 'email', 'fix', 'write', 'review', 'buy', 'plan',
+             'report', 'garden', 'taxes', 'car', 'meeting', 'notes']
+    start = datetime.date(2020, 1, 1)
+    lines = []
+    for i in range(count):
+        parts = []
+        done = rng.random() < 0.2
+        if done:
+            parts.append('x')
+        elif rng.random() < 0.3:
+            parts.append('({})'.format(rng.choice('ABC')))
+        if done:
+            parts.append(str(start + datetime.timedelta(rng.randrange(900))))
+        if rng.random() < 0.7:
+            parts.append(str(start + datetime.timedelta(rng.randrange(900))))
+        parts.extend(rng.choice(words) for _ in range(rng.randint(2, 6)))
+        parts.extend('+' + rng.choice(words) for _ in range(rng.randint(0, 2)))
+        parts.extend('@' + rng.choice(words) for _ in range(rng.randint(0, 1)))
+        if rng.random() < 0.1:
+            parts.append('R:a{}'.format(rng.randint(1, 9)))
+        added = start + datetime.timedelta(rng.randrange(900))
+        parts.append('A:{}'.format(added))
+        parts.append('O:{}'.format(base62.encode(i + 1)))
+        lines.append(' '.join(parts) + '\n')
+    return lines
+
+
+def parse_tasks(lines):
+    """parse lines into tasks"""
+    return [parse.Task(l) for l in lines]
+
+
+def timed(func, *args):
+    """return the result of func and the seconds it took, without gc"""
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def report(title, timings):
+    """print named timings relative to the first"""
+    print(title)
+    base = timings[0][1]
+    for name, seconds in timings:
+        print('  {:<24}{:>9.3f}s {:>7.2f}x'.format(name, seconds,
+                                                 base / seconds))
+
+
+def bench_parse(count=100000, runs=5):
+    """
+    regex extraction passes against the single-pass tokenizer, each timed
+    at its best of a few runs, taken in turn
+    """
+    lines = generate_lines(count)
+    legacy_time = tokens_time = float('inf')
+    for _ in range(runs):
+        legacy, seconds = timed(lambda: [parse.scan_regex(l) for l in lines])
+        legacy_time = min(legacy_time, seconds)
+        tokens, seconds = timed(lambda: [parse.scan(l) for l in lines])
+        tokens_time = min(tokens_time, seconds)
+    assert legacy == tokens, 'tokenizer output differs from regex parser'
+    report('parse {} lines'.format(count),
+           [('scan_regex', legacy_time), ('scan', tokens_time)])
+
+
+def chained_sort(tasks):
+    """the list ordering as four successive stable sorts"""
+    tasks = sorted(tasks, key=lambda t: t.order if t.order else 9**9)
+    tasks = sorted(tasks, key=lambda t: t.priority if t.priority else 'Z')
+    tasks = sorted(tasks, key=lambda t: t.due if t.due else
+                   datetime.date(3000, 1, 1))
+    tasks = sorted(tasks, key=lambda t: t.done if t.done else
+                   datetime.date(1, 1, 1))
+    return tasks
+
+
+def bench_sort(count=100000):
+    """chained sorts against one composite key sort"""
+    import taskland
+    tasks = parse_tasks(generate_lines(count))
+    chained, chained_time = timed(chained_sort, tasks)
+    single, single_time = timed(taskland.sort_tasks, tasks)
+    assert chained == single, 'composite key sort changes the order'
+    report('sort {} tasks'.format(count),
+           [('chained sorts', chained_time), ('sort_tasks', single_time)])
+
+
+def bench_index(count=20000, projects=300):
+    """grouping and filtering by rescanning against the inverted index"""
+    rng = random.Random(1)
+    lines = ['{} +p{} +p{}\n'.format(l.rstrip('\n'), rng.randrange(projects),
+                                     rng.randrange(projects))
+             for l in generate_lines(count)]
+    tasks = parse_tasks(lines)
+
+    def scan_views():
+        grouped = [t for p in utils.projects_get(tasks) for t in tasks
+                   if p in t.projects]
+        found = [t for t in tasks if any(s in t.text for s in ['ax', 'ar'])]
+        return grouped, found
+
+    def index_views():
+        task_index = index.TaskIndex(tasks)
+        return (views.view_by_project(tasks, task_index),
+                views.filter_include_any(tasks, 'ax ar', task_index))
+
+    scanned, scan_time = timed(scan_views)
+    indexed, index_time = timed(index_views)
+    assert scanned == indexed, 'indexed views differ from scanning'
+    report('bp and any on {} tasks, {} projects'.format(count, projects),
+           [('rescanning', scan_time), ('TaskIndex', index_time)])
+
+
+def generate_tree(count, depth, seed=0):
+    """generate lines forming subtask trees no deeper than depth"""
+    rng = random.Random(seed)
+    depths = [0]
+    lines = ['task 0 P:1']
+    for i in range(1, count):
+        parent = rng.randrange(max(0, i - 2), i)
+        while depths[parent] >= depth - 1:
+            parent = rng.randrange(i)
+        depths.append(depths[parent] + 1)
+        lines.append('task {} P:{} C:{}'.format(i, i + 1, parent + 1))
+    rng.shuffle(lines)
+    return lines
+
+
+def scan_nest_sort(tasks):
+    """nest sort by repeatedly scanning the remaining tasks"""
+    parent_ids = [t.parent_id for t in tasks if t.parent_id is not None]
+    nest_sorted = [t for t in tasks if not t.child_id or
+                   t.child_id not in parent_ids]
+    remaining = [t for t in tasks if t not in nest_sorted]
+    i = 0
+    while len(remaining) > 0:
+        if nest_sorted[i].parent_id:
+            children = [t for t in remaining
+                        if t.child_id == nest_sorted[i].parent_id]
+            remaining = [t for t in remaining if t not in children]
+            nest_sorted = nest_sorted[:i+1] + children + nest_sorted[i+1:]
+        i += 1
+    return nest_sorted
+
+
+def bench_nest(count=10000, depth=50):
+    """nest sorting and rendering a deep subtask tree"""
+    import io
+    import contextlib
+    tasks = parse_tasks(generate_tree(count, depth))
+    scanned, scan_time = timed(scan_nest_sort, tasks)
+    nested, nest_time = timed(views.nest_sort, tasks)
+    assert scanned == nested, 'nest_sort order differs from rescanning'
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, render_time = timed(views.nest, tasks, False, [])
+    report('nest {} tasks, depth {}'.format(count, depth),
+           [('rescanning nest_sort', scan_time), ('nest_sort', nest_time),
+            ('nest (sort and render)', render_time)])
+
+
+class EagerTask(object):
+    """a task decoding every field up front, with an attribute dict"""
+
+    def __init__(self, line):
+        self.num = 0
+        self.source = None
+        (self.x, self.priority, self.child_id, self.repeat, self.contexts,
+         self.projects, self.parent_id, self.added, self.order, self.uid,
+         dates, self.text) = parse.scan(line)
+        self.done = None
+        self.due = None
+        if self.added is not None:
+            self.added = utils.string_to_datetime(self.added)
+        dates = [utils.string_to_datetime(d) for d in dates]
+        if len(dates) == 2:
+            self.done, self.due = dates[0], dates[1]
+        elif len(dates) == 1 and self.x is not None:
+            self.done = dates[0]
+        elif len(dates) == 1:
+            self.due = dates[0]
+        if self.order is not None:
+            self.order = base62.decode(self.order)
+        if self.parent_id is not None and 'c' in self.parent_id:
+            self.parent_id = self.parent_id[:-1]
+            self.contracted = True
+        else:
+            self.contracted = False
+
+
+def traced(func, *args):
+    """return the result of func and the bytes it left allocated"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def snapshot(task, *location):
+    """record where a task was read from keeping all its values, as it was"""
+    task.source = location + (task.fields(),)
+
+
+def bench_memory(count=100000):
+    """
+    memory and load time of eagerly decoded tasks against lazy ones, and of
+    lazy tasks recording where they were read from
+    """
+    import taskland
+    lines = generate_lines(count)
+    spans = taskland.line_spans(''.join(lines).encode())
+
+    def load(task):
+        return taskland.sort_tasks([task(l) for l in lines])
+
+    def load_recorded(record):
+        tasks = [parse.Task(l) for l in lines]
+        for i, (t, span) in enumerate(zip(tasks, spans)):
+            record(t, i, *span)
+        return taskland.sort_tasks(tasks)
+
+    eager, eager_size = traced(load, EagerTask)
+    lazy, lazy_size = traced(load, parse.Task)
+    assert ([(t.text, t.due, t.added) for t in eager] ==
+            [(t.text, t.due, t.added) for t in lazy]), 'tasks differ'
+    del eager, lazy
+    _, snapshot_size = traced(load_recorded, snapshot)
+    _, hashed_size = traced(load_recorded, parse.Task.load)
+    _, eager_time = timed(load, EagerTask)
+    _, lazy_time = timed(load, parse.Task)
+    _, snapshot_time = timed(load_recorded, snapshot)
+    _, hashed_time = timed(load_recorded, parse.Task.load)
+    print('parse and sort {} tasks'.format(count))
+    for name, size, seconds in (
+            ('eager, __dict__', eager_size, eager_time),
+            ('lazy, __slots__', lazy_size, lazy_time),
+            ('loaded, values kept', snapshot_size, snapshot_time),
+            ('loaded, values hashed', hashed_size, hashed_time)):
+        print('  {:<24}{:>9.3f}s {:>7} bytes/task'.format(
+            name, seconds, size // count))
+
+
+def bench_store(count=100000):
+    """loading and filtering the list against selecting in sqlite"""
+    import taskland
+    db = store.SQLiteStore(':memory:')
+    db.write(taskland.sort_tasks(parse_tasks(generate_lines(count))))
+    command_list = [('vp', ['garden'])]
+
+    def load_and_filter():
+        tasks, ordering = db.load()
+        tasks = [tasks[i] for i in ordering]
+        for i, t in enumerate(tasks):
+            t.num = i+1
+        return taskland.execute_command_list(
+            tasks, command_list, taskland.view_commands)[:10]
+
+    loaded, load_time = timed(load_and_filter)
+    selected, select_time = timed(db.select, command_list, 10)
+    assert ([(t.num, t.fields()) for t in loaded] ==
+            [(t.num, t.fields()) for t in selected]), 'selections differ'
+    report('vp limit 10 on {} tasks'.format(count),
+           [('load and filter', load_time), ('SQLiteStore.select',
+                                             select_time)])
+
+
+def colorize(string, color):
+    """colorize as it was, building the table of colors on every call"""
+    colors = {'red': 1, 'green': 2, 'yellow': 3, 'blue': 4, 'magenta': 13,
+              'cyan': 6, 'orange': 9, 'gray': 10, 'white': 14}
+    return '\x1b[38;5;{}m{}\x1b[0m'.format(colors[color], string)
+
+
+def legacy_compose_line(task, color, exclusions):
+    """compose a line evaluating and filtering every component each time"""
+    parts = [
+        ('n', 'gray', task.num_string),
+        ('x', 'gray', task.x),
+        ('pr', 'red', task.priority),
+        ('dn', 'gray', task.done.strftime('%Y-%m-%d') if task.done else None),
+        ('d', 'orange', task.due.strftime('%Y-%m-%d') if task.due else None),
+        ('t', 'white', task.text),
+        ('p', 'blue', task.projects_string),
+        ('c', 'yellow', task.contexts_string),
+        ('r', 'magenta', task.repeat_string),
+        ('a', 'green',
+         task.added.strftime('A:%Y-%m-%d') if task.added else None),
+        ('o', 'gray', task.order_string),
+        ('p_id', 'gray', task.parent_id_string),
+        ('c_id', 'gray', task.child_id_string),
+        ]
+    if color:
+        parts = [colorize(s, c) for l, c, s in parts
+                 if l not in exclusions and s]
+    else:
+        parts = [s for l, c, s in parts if l not in exclusions and s]
+    return ' '.join(parts)
+
+
+def bench_render(count=100000):
+    """composing lines for display and for writing, before and with plans"""
+    tasks = parse_tasks(generate_lines(count))
+    for title, color, exclusions in (('display', True, ['o', 'a']),
+                                     ('write', False, ['n'])):
+        legacy, legacy_time = timed(
+            lambda: [legacy_compose_line(t, color, exclusions)
+                     for t in tasks])
+        planned, plan_time = timed(
+            lambda: [t.compose_line(color, exclusions) for t in tasks])
+        assert legacy == planned, 'render plan output differs'
+        report('compose {} lines for {}'.format(count, title),
+               [('legacy', legacy_time), ('render plan', plan_time)])
+
+
+# the filter views as they were before they were built on predicates, each
+# making a list of the tasks it keeps
+legacy_filters = {
+    'vp': lambda tasks, strings: [
+        t for t in tasks if any(s in t.projects for s in strings.split(' '))],
+    'any': lambda tasks, strings: [
+        t for t in tasks if any(s in t.text for s in strings.split(' '))],
+    'until': lambda tasks, string: legacy_until(
+        tasks, utils.code_to_datetime(string)),
+    }
+
+
+def legacy_until(tasks, date):
+    return [t for t in tasks if t.due and t.due <= date and not t.x]
+
+
+def bench_filters(count=100000):
+    """
+    a chain of filter views applied one at a time as list comprehensions,
+    and fused into one pass with the date cutoff tried first and last. each
+    is timed at its best of a few runs
+    """
+    import taskland
+    fields = [t.fields() for t in parse_tasks(generate_lines(count))]
+    ordering = table.TaskTable(fields).ordering()
+    command_list = [('vp', ['garden']), ('any', ['e']),
+                    ('until', ['2021-06-01'])]
+
+    def fresh():
+        # built from the parsed fields as views get them, with their dates
+        # decoded on first use, so each run gets tasks of its own
+        return list(taskland.build_tasks(fields, ordering))
+
+    def sequential(tasks):
+        for command, args in command_list:
+            tasks = legacy_filters[command](tasks, *args)
+        return tasks
+
+    def fused(tasks, commands):
+        predicates = [taskland.filter_predicates[command](*args)
+                      for command, args in commands]
+        return list(views.filter_all(tasks, predicates))
+
+    def best(func, *args):
+        runs = [timed(func, fresh(), *args) for _ in range(runs_each)]
+        return runs[0][0], min(seconds for _, seconds in runs)
+
+    runs_each = 5
+    chained, chained_time = best(sequential)
+    dates_first, dates_time = best(fused,
+                                   command_list[-1:] + command_list[:-1])
+    tags_first, tags_time = best(taskland.execute_command_list,
+                                 command_list, taskland.view_commands)
+    expected = [t.fields() for t in chained]
+    assert [t.fields() for t in dates_first] == expected, 'dates first differs'
+    assert [t.fields() for t in tags_first] == expected, 'tags first differs'
+    report('vp, any and until on {} tasks'.format(count),
+           [('one view at a time', chained_time),
+            ('fused, dates first', dates_time),
+            ('fused, tags first', tags_time)])
+
+
+def bench_dates(count=100000, codes=10000):
+    """
+    a view of the tasks due by a date, scanning the list and searching the
+    due dates, and date codes resolved on every use and once a day
+    """
+    import taskland
+    tasks = taskland.sort_tasks(parse_tasks(generate_lines(count)))
+    fields = [t.fields() for t in tasks]
+    ordering = list(range(len(tasks)))
+    # a cutoff keeping a tenth of the unfinished tasks
+    dues = sorted(t.due for t in tasks if not t.x and t.due is not None)
+    cutoff = dues[len(dues) // 10]
+
+    def scanned():
+        predicate = views.due_until(cutoff)
+        return [t.num for t in taskland.build_tasks(fields, ordering)
+                if predicate(t)]
+
+    def searched(dues):
+        dates, positions = dues
+        end = bisect.bisect_right(dates, cutoff.toordinal())
+        return [position + 1 for position in sorted(positions[:end])]
+
+    scan, scan_time = timed(scanned)
+    dues, index_time = timed(table.TaskTable(fields).dues, ordering)
+    search, search_time = timed(searched, dues)
+    assert scan == search, 'searched tasks differ'
+    report('unfinished tasks due by {}, {} of {}'.format(
+        cutoff, len(scan), count),
+        [('scan', scan_time), ('index the due dates', index_time),
+         ('search the index', search_time)])
+
+    def resolve(resolver):
+        return [resolver(code) for code in ['15', '11-30', 'f'] * (codes // 3)]
+
+    def unresolved(code):
+        utils.resolved_codes.clear()
+        return utils.code_to_datetime(code)
+
+    every, every_time = timed(resolve, unresolved)
+    utils.resolved_codes.clear()
+    once, once_time = timed(resolve, utils.code_to_datetime)
+    assert every == once, 'resolved codes differ'
+    report('{} date codes'.format(len(every)),
+           [('resolved every time', every_time), ('once a day', once_time)])
+
+
+def bench_table(count=100000):
+    """
+    sorting the list and counting its projects as task objects and as a
+    table of columns, in python and with numpy if it is installed
+    """
+    import taskland
+    lines = generate_lines(count)
+    fields = [t.fields() for t in parse_tasks(lines)]
+
+    def sort_objects():
+        tasks = [parse.Task.from_fields(f) for f in fields]
+        positions = {id(t): i for i, t in enumerate(tasks)}
+        return [positions[id(t)] for t in taskland.sort_tasks(tasks)]
+
+    def count_objects():
+        tasks = [parse.Task.from_fields(f) for f in fields]
+        return collections.Counter(p for t in tasks for p in set(t.projects))
+
+    def sort_table(numpy_rows):
+        table.NUMPY_ROWS = numpy_rows
+        return table.TaskTable(fields).ordering()
+
+    def count_table(numpy_rows):
+        table.NUMPY_ROWS = numpy_rows
+        return table.TaskTable(fields).counts('projects')
+
+    rows = table.NUMPY_ROWS
+    table.NUMPY_ROWS = 0
+    numpy = table.load_numpy(count) is not None
+    try:
+        for title, objects, columns in (('sort', sort_objects, sort_table),
+                                        ('count projects', count_objects,
+                                         count_table)):
+            expected, object_time = timed(objects)
+            result, python_time = timed(columns, float('inf'))
+            assert result == expected, title + ' differs in python'
+            timings = [('task objects', object_time),
+                       ('table in python', python_time)]
+            if numpy:
+                result, numpy_time = timed(columns, 0)
+                assert result == expected, title + ' differs with numpy'
+                timings.append(('table with numpy', numpy_time))
+            report('{} {} tasks'.format(title, count), timings)
+    finally:
+        table.NUMPY_ROWS = rows
+
+
+def bench_stats(count=200000, appended=100):
+    """
+    counting archived tasks done per day by reading the whole archive file,
+    and from the counts kept beside it, before and after tasks are added
+    """
+    import archive
+    lines = [l if l.startswith('x ') else 'x 2021-06-01 ' + l
+             for l in generate_lines(count + appended)]
+    folder = tempfile.mkdtemp()
+    location = os.path.join(folder, 'archive.txt')
+    try:
+        with open(location, 'w') as f:
+            f.writelines(lines[:count])
+
+        def read_all():
+            with open(location) as f:
+                return collections.Counter(
+                    t.done.isoformat() for t in map(parse.Task, f) if t.done)
+
+        def append():
+            with open(location, 'a') as f:
+                f.writelines(lines[count:])
+
+        expected, read_time = timed(read_all)
+        result, first_time = timed(archive.file_done_days, location)
+        assert result == expected, 'first count differs'
+        result, again_time = timed(archive.file_done_days, location)
+        assert result == expected, 'repeated count differs'
+        append()
+        expected = read_all()
+        result, appended_time = timed(archive.file_done_days, location)
+        assert result == expected, 'count after adding differs'
+        report('done per day over {} archived tasks'.format(count), [
+            ('reading the archive', read_time),
+            ('first count', first_time),
+            ('counted again', again_time),
+            ('{} tasks added'.format(appended), appended_time)])
+    finally:
+        shutil.rmtree(folder)
+
+
+def scratch_copy(lines):
+    """return a temporary folder holding taskland and a list of lines"""
+    folder = tempfile.mkdtemp()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in os.listdir(here):
+        if name.endswith('.py'):
+            shutil.copy(os.path.join(here, name), folder)
+    with open(os.path.join(folder, 'config.rc'), 'w') as f:
+        f.write('list_location=todo.txt\n')
+    with open(os.path.join(folder, 'todo.txt'), 'w') as f:
+        f.writelines(lines)
+    return folder
+
+
+def bench_writers(writers=8, rounds=10, count=1000):
+    """
+    parallel writers changing one list, through the whole list and by id,
+    checking that no change is lost
+    """
+    # one task for each writer to change by id
+    owned = ['writer{} I:w{}\n'.format(w, w) for w in range(writers)]
+    folder = scratch_copy(generate_lines(count) + owned)
+    try:
+
+        def write(w):
+            for i in range(rounds):
+                for args in (['add', 'w{}r{}'.format(w, i)],
+                             ['c', 'w{}r{}'.format(w, i), '#w{}'.format(w)]):
+                    subprocess.run([sys.executable, 'taskland.py'] + args,
+                                   cwd=folder, stdout=subprocess.DEVNULL,
+                                   check=True)
+
+        threads = [threading.Thread(target=write, args=(w,))
+                   for w in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        with open(os.path.join(folder, 'todo.txt')) as f:
+            tasks = parse_tasks(f)
+        texts = {t.text for t in tasks}
+        contexts = {c for t in tasks for c in t.contexts}
+        for w in range(writers):
+            for i in range(rounds):
+                name = 'w{}r{}'.format(w, i)
+                assert name in texts, 'lost add ' + name
+                assert name in contexts, 'lost context ' + name
+        assert len(tasks) == count + writers * (rounds + 1), 'task count'
+    finally:
+        shutil.rmtree(folder)
+    changes = writers * rounds * 2
+    print('{} writers, {} changes to {} tasks'.format(writers, changes, count))
+    print('  {:<24}{:>9.3f}s {:>7.1f}/s'.format('no change lost', seconds,
+                                               changes / seconds))
+
+
+# applies lines in shell mode while its writer waits, then has it write them
+# together, printing the ids of the tasks in memory and as written
+coalesced_script = """
+import json, sys, taskland
+taskland.load_settings()
+tasks = taskland.collect_tasks()
+writer = taskland.WriteBehind(taskland.loaded['version'])
+for line in json.loads(sys.argv[1]):
+    tasks = taskland.shell_action(writer, tasks, line.split(' '))
+    tasks = taskland.settle_tasks(tasks)
+writer.flush()
+if writer.stale():
+    tasks = writer.reread()
+shown = {t.text: t.uid for t in tasks}
+writer.close()
+written = {t.text: t.uid for t in taskland.collect_tasks()}
+print(json.dumps([shown, written]))
+"""
+
+
+def bench_coalesced(count=1000):
+    """
+    shell mode lines written together by its writer, checking that the
+    tasks they add have the ids the shell gave them
+    """
+    import json
+    lines = ['add alpha', 'add beta , pr a', 'add gamma']
+    folder = scratch_copy(generate_lines(count))
+    try:
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', coalesced_script,
+                                 json.dumps(lines)], cwd=folder,
+                                stdout=subprocess.PIPE, check=True)
+        seconds = time.perf_counter() - start
+        # errors printed on the way come before the ids
+        shown, written = json.loads(result.stdout.splitlines()[-1])
+        for name in ('alpha', 'beta', 'gamma'):
+            assert shown[name] == written[name], 'id of {} differs'.format(
+                name)
+    finally:
+        shutil.rmtree(folder)
+    print('{} shell lines written together to {} tasks'.format(len(lines),
+                                                              count))
+    print('  {:<24}{:>9.3f}s'.format('ids as shown', seconds))
+
+
+def imported(args, folder):
+    """
+    run python -X importtime with args, returning the wall time and the
+    self times in microseconds of the modules imported, by name
+    """
+    # bytecode is written and used, as it is once taskland is installed
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                            cwd=folder, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, check=True,
+                            universal_newlines=True)
+    seconds = time.perf_counter() - start
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            own, _, name = line[len('import time:'):].split('|')
+            if own.strip().isdigit():
+                modules[name.strip()] = int(own)
+    return seconds, modules
+
+
+def bench_startup(count=1000, runs=10):
+    """
+    cold start of a view, a listing and an action: the wall time of the
+    whole command and the time spent importing the modules it needs
+    beyond those of a bare interpreter, medians of several runs
+    """
+    folder = scratch_copy(generate_lines(count))
+    try:
+        _, bare = imported(['-c', 'pass'], folder)
+        print('startup, {} tasks, median of {} runs'.format(count, runs))
+        for args in (['h'], ['pp'], ['add', 'startup', 'task']):
+            # the first run writes the bytecode and the list cache
+            imported(['taskland.py'] + args, folder)
+            walls = []
+            imports = []
+            for _ in range(runs):
+                seconds, modules = imported(['taskland.py'] + args, folder)
+                walls.append(seconds)
+                own = [us for name, us in modules.items() if name not in bare]
+                imports.append((sum(own), len(own)))
+            walls.sort()
+            imports.sort()
+            us, loaded = imports[runs // 2]
+            print('  {:<24}{:>9.3f}s {:>7.1f}ms imports ({} modules)'.format(
+                ' '.join(args[:1]), walls[runs // 2], us / 1000, loaded))
+    finally:
+        shutil.rmtree(folder)
+
+
+benchmarks = collections.OrderedDict([
+    ('parse', bench_parse),
+    ('sort', bench_sort),
+    ('index', bench_index),
+    ('nest', bench_nest),
+    ('memory', bench_memory),
+    ('store', bench_store),
+    ('render', bench_render),
+    ('filters', bench_filters),
+    ('dates', bench_dates),
+    ('table', bench_table),
+    ('stats', bench_stats),
+    ('writers', bench_writers),
+    ('coalesced', bench_coalesced),
+    ('startup', bench_startup),
+    ])
+
+
+def main(names):
+    for name in names or benchmarks.keys():
+        benchmarks[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
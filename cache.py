@@ -0,0 +1,97 @@
+#!/usr/bin/python
+"""binary cache of the parsed task list, kept beside the list file"""
+
+import os
+import hashlib
+import pickle
+
+VERSION = 3
+
+
+def cache_location(list_location, kind='cache'):
+    """return the path of a cache file belonging to a list file"""
+    head, tail = os.path.split(list_location)
+    return os.path.join(head, '.{}.{}'.format(tail, kind))
+
+
+def signature(list_location, data):
+    """identify the list file contents by mtime, size and hash"""
+    stat = os.stat(list_location)
+    return (stat.st_mtime_ns, stat.st_size, hashlib.sha1(data).hexdigest())
+
+
+def load(list_location, data):
+    """
+    return the cached (fields, ordering) of the list, or None.
+
+    fields holds the parsed tasks in file order, ordering the file indexes
+    in sorted order. data is the raw content of the list file, and the
+    cache is only used if it was built from that exact content.
+    """
+    try:
+        with open(cache_location(list_location), 'rb') as f:
+            version, stamp, fields, ordering = pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+    if version != VERSION:
+        return None
+    stat = os.stat(list_location)
+    if stamp[:2] != (stat.st_mtime_ns, stat.st_size):
+        return None
+    if stamp[2] != hashlib.sha1(data).hexdigest():
+        return None
+    return fields, ordering
+
+
+def save(list_location, data, fields, ordering):
+    """write the parsed fields and their sorted ordering to the cache"""
+    location = cache_location(list_location)
+    # other processes may be saving it at the same time
+    temp = '{}.{}.tmp'.format(location, os.getpid())
+    try:
+        with open(temp, 'wb') as f:
+            pickle.dump((VERSION, signature(list_location, data), fields,
+                         ordering), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, location)
+    except OSError:
+        pass
+
+
+def load_marker(list_location, kind, stamp):
+    """
+    return the (found, value) of a small value remembered for the list
+    file. found is False unless it was saved while the list file had the
+    given mtime and size stamp.
+    """
+    try:
+        with open(cache_location(list_location, kind), 'rb') as f:
+            saved, value = pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return False, None
+    if saved != stamp:
+        return False, None
+    return True, value
+
+
+def save_marker(list_location, kind, stamp, value):
+    """remember a small value for the list file in the given stamp"""
+    location = cache_location(list_location, kind)
+    temp = '{}.{}.tmp'.format(location, os.getpid())
+    try:
+        with open(temp, 'wb') as f:
+            pickle.dump((stamp, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, location)
+    except OSError:
+        pass
+
+
+def save_text(list_location, kind, lines):
+    """write lines of text for the list file, for other programs to read"""
+    location = cache_location(list_location, kind)
+    temp = '{}.{}.tmp'.format(location, os.getpid())
+    try:
+        with open(temp, 'w') as f:
+            f.writelines(line + '\n' for line in lines)
+        os.replace(temp, location)
+    except OSError:
+        pass
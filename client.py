@@ -0,0 +1,23 @@
+#!/usr/bin/python
+
+"""
+File: client.py
+Description: runs taskland commands through a running server if there is
+one, and directly otherwise. start the server with 'taskland.py serve'.
+"""
+
+import sys
+import server
+
+
+def main(args):
+    output = server.request(args)
+    if output is None:
+        import taskland
+        taskland.main(args)
+    else:
+        sys.stdout.write(output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -5,7 +5,6 @@ import os
 
 def separate(string):
     parts = string.split('"')
-    print(parts)
     return ''.join([p.strip() for p in parts if p != ''])
 
 
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+"""lookup tables from projects, contexts and words to tasks"""
+
+import collections
+
+
+def positions_by(tasks, values):
+    """map each value returned by values(task) to the positions holding it"""
+    table = collections.defaultdict(list)
+    for i, t in enumerate(tasks):
+        for value in values(t):
+            positions = table[value]
+            if not positions or positions[-1] != i:
+                positions.append(i)
+    return table
+
+
+class TaskIndex(object):
+    """
+    inverted index of a task list.
+
+    maps every project, context and word of task text to the sorted
+    positions of the tasks that have it. each table is built the first time
+    it is needed.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.positions = {id(t): i for i, t in enumerate(tasks)}
+        self._projects = None
+        self._contexts = None
+        self._words = None
+
+    @property
+    def projects(self):
+        if self._projects is None:
+            self._projects = positions_by(self.tasks, lambda t: t.projects)
+        return self._projects
+
+    @property
+    def contexts(self):
+        if self._contexts is None:
+            self._contexts = positions_by(self.tasks, lambda t: t.contexts)
+        return self._contexts
+
+    @property
+    def words(self):
+        if self._words is None:
+            self._words = positions_by(self.tasks,
+                                       lambda t: t.text.split(' '))
+        return self._words
+
+    def covers(self, tasks):
+        """check if tasks is the indexed list itself"""
+        return tasks is self.tasks
+
+    def with_projects(self, names):
+        """return positions of tasks having any of the projects"""
+        return {i for n in names for i in self.projects.get(n, ())}
+
+    def with_contexts(self, names):
+        """return positions of tasks having any of the contexts"""
+        return {i for n in names for i in self.contexts.get(n, ())}
+
+    def containing(self, string):
+        """return positions of tasks whose text contains string"""
+        # string holds no spaces, so it can only occur within a single word
+        return {i for w, positions in self.words.items() if string in w
+                for i in positions}
+
+    def select(self, tasks, positions):
+        """return the tasks, in their order, whose position is given"""
+        return [t for t in tasks if self.positions.get(id(t)) in positions]
+
+    def exclude(self, tasks, positions):
+        """return the tasks, in their order, whose position is not given"""
+        return [t for t in tasks
+                if self.positions.get(id(t)) not in positions]
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+"""journal of action commands applied in memory but not yet written"""
+
+import os
+import glob
+import json
+import fcntl
+
+
+class Journal(object):
+    """
+    lines of action commands recorded, and synced to disk, before they are
+    taken as done, along with how far they have been written to the list.
+
+    entries are numbered as they are recorded. before the list is written
+    an intent is recorded with the digest of the list as it was, and once
+    it is written the number of the last entry it holds. the journal is
+    locked for as long as its process uses it.
+    """
+
+    def __init__(self, location):
+        self.location = location
+        self.fd = None
+
+    def open(self):
+        """
+        open and lock the journal. raises BlockingIOError if it is locked
+        by another process.
+        """
+        fd = os.open(self.location, os.O_RDWR | os.O_CREAT | os.O_APPEND,
+                     0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise
+        self.fd = fd
+
+    def record(self, **fields):
+        """append a record and sync it to disk"""
+        os.write(self.fd, (json.dumps(fields) + '\n').encode())
+        os.fsync(self.fd)
+
+    def records(self):
+        """return the records, leaving out one cut short by a crash"""
+        with open(self.location, 'rb') as f:
+            lines = f.read().split(b'\n')
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line.decode()))
+            except ValueError:
+                break
+        return records
+
+    def clear(self):
+        """drop all records, once the list holds every entry"""
+        os.ftruncate(self.fd, 0)
+        os.fsync(self.fd)
+
+    def remove(self):
+        os.remove(self.location)
+        os.close(self.fd)
+        self.fd = None
+
+    def unwritten(self, digest):
+        """
+        return the args of the entries the list doesn't hold. digest returns
+        the digest of the list as it is, which tells if a write that was
+        under way has been made.
+        """
+        entries = []
+        written = 0
+        intent = None
+        for record in self.records():
+            if 'args' in record:
+                entries.append((record['entry'], record['args']))
+            elif 'intent' in record:
+                intent = record
+            elif 'written' in record:
+                written = record['written']
+                intent = None
+        if intent is not None and intent['digest'] != digest():
+            written = intent['intent']
+        return [args for entry, args in entries if entry > written]
+
+
+def orphans(pattern):
+    """
+    return the opened journals matching a glob pattern that are no longer
+    used by the process that made them
+    """
+    journals = []
+    for location in glob.glob(pattern):
+        left = Journal(location)
+        try:
+            left.open()
+        except OSError:
+            continue
+        journals.append(left)
+    return journals
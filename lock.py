@@ -0,0 +1,89 @@
+#!/usr/bin/python
+"""advisory lock on the task list, kept in a file beside it"""
+
+import os
+import fcntl
+import threading
+
+
+class ListLock(object):
+    """
+    exclusive lock held while the task list is read, changed and written,
+    so that writers in other processes wait their turn instead of
+    overwriting each other's changes. taken again by the process holding
+    it, it is simply held until the outermost release. threads of one
+    process take it in turn, as they share the depth it is held to.
+
+    the lock file also counts the writes made under the lock. the count
+    tells if the list was written since it was read, which file mtimes
+    can miss when two writes fall within their resolution. it also holds
+    the highest task id given out, so that ids of tasks removed or
+    archived are not given out again.
+    """
+
+    def __init__(self, location):
+        self.location = location
+        self.fd = None
+        self.depth = 0
+        self.guard = threading.RLock()
+
+    def open(self):
+        if self.fd is None:
+            self.fd = os.open(self.location, os.O_RDWR | os.O_CREAT, 0o644)
+        return self.fd
+
+    def __enter__(self):
+        self.guard.acquire()
+        try:
+            if self.depth == 0:
+                fcntl.flock(self.open(), fcntl.LOCK_EX)
+        except BaseException:
+            self.guard.release()
+            raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, *_):
+        self.depth -= 1
+        if self.depth == 0:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.guard.release()
+
+    def read(self):
+        """
+        return the number of writes made under the lock and the highest task
+        id given out, as a number
+        """
+        with self.guard:
+            fd = self.open()
+            if self.depth == 0:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            try:
+                data = os.pread(fd, 64, 0)
+            finally:
+                if self.depth == 0:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        try:
+            values = [int(v) for v in data.split()]
+        except ValueError:
+            return 0, 0
+        # lock files written before ids were counted hold only the writes
+        return tuple(values + [0, 0])[:2]
+
+    def count(self):
+        """return the number of writes made under the lock"""
+        return self.read()[0]
+
+    def highest_id(self):
+        """return the highest task id given out, which never goes down"""
+        return self.read()[1]
+
+    def written(self, highest_id=0):
+        """
+        count a write of the list, made while holding the lock, which gave
+        out task ids up to highest_id
+        """
+        count, highest = self.read()
+        data = '{} {}'.format(count + 1, max(highest, highest_id)).encode()
+        os.pwrite(self.fd, data, 0)
+        os.ftruncate(self.fd, len(data))
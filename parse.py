@@ -2,6 +2,8 @@
 """task class and functions for parsing lines as tasks"""
 
 import re
+import sys
+import operator
 import base62
 import utils
 
@@ -14,7 +16,14 @@ p_id_re = re.compile(r'P:(\w+)')
 c_id_re = re.compile(r'C:(\d+)')
 r_id_re = re.compile(r'R:(\w+)')
 o_re = re.compile(r'O:(\w+)')
+i_re = re.compile(r'I:(\w+)')
 date_re = re.compile(r'(\d{4}-\d{2}-\d{2})')
+token_re = re.compile(r' (?:\+(?P<p>\w+)|@(?P<c>\w+)|P:(?P<p_id>\w+)|'
+                      r'C:(?P<c_id>\d+)|R:(?P<r_id>\w+)|O:(?P<o>\w+)|'
+                      r'I:(?P<i>\w+)|A:(?P<a>[\d\-]+)|'
+                      r'(?P<date>\d{4}-\d{2}-\d{2}))'
+                      r'(?= |$)')
+tag_re = re.compile(r'[+@]|[PCROAI]:|\d{4}-\d{2}-\d{2}')
 
 
 def extract(line, reg):
@@ -41,40 +50,153 @@ def extract_all(line, reg):
     return line, targets
 
 
+def scan_regex(line):
+    """split a line into its raw fields with one regex pass per field"""
+    line, x = extract(line, x_re)
+    line, priority = extract(line, pri_re)
+    line, child_id = extract(line, c_id_re)
+    line, repeat = extract(line, r_id_re)
+    line, contexts = extract_all(line, c_re)
+    line, projects = extract_all(line, p_re)
+    line, parent_id = extract(line, p_id_re)
+    line, added = extract(line, a_re)
+    line, order = extract(line, o_re)
+    line, uid = extract(line, i_re)
+    line, dates = extract_all(line, date_re)
+    return (x, priority, child_id, repeat, contexts, projects, parent_id,
+            added, order, uid, dates, line.strip())
+
+
+# projects, contexts and dates repeat from task to task, and are kept once
+# each. ids and order tags are unique, and interning them only costs time
+intern = sys.intern
+
+
+def scan_tokens(line):
+    """
+    split a line into its raw fields in a single pass over its tokens.
+
+    returns None if the line holds anything the sequential extraction of
+    scan_regex would treat differently from whole tokens, such as tags
+    glued to other text or repeated single-value tags.
+    """
+    if line.endswith('\n'):
+        line = line[:-1]
+    x = priority = None
+    if line.startswith('x'):
+        if line[1:2] not in ('', ' '):
+            return None
+        x = 'x'
+        line = line[1:]
+    elif line.startswith('('):
+        priority = line[:3]
+        if not pri_re.fullmatch(priority) or line[3:4] not in ('', ' '):
+            return None
+        line = line[3:]
+    line = ' ' + line
+
+    found = {}
+    contexts = []
+    projects = []
+    dates = []
+    # the text is what lies between the tags, as found on the way
+    pieces = []
+    last = 0
+    for match in token_re.finditer(line):
+        kind = match.lastgroup
+        value = match[kind]
+        pieces.append(line[last:match.start()])
+        last = match.end()
+        if kind == 'c':
+            contexts.append(intern(value))
+        elif kind == 'p':
+            projects.append(intern(value))
+        elif kind == 'date':
+            dates.append(intern(value))
+        elif kind in found:
+            return None
+        elif kind == 'a':
+            found[kind] = intern(value)
+        else:
+            found[kind] = value
+    pieces.append(line[last:])
+    text = ' '.join(pieces)
+
+    # tags left in the remaining text mean the line isn't cleanly tokenized
+    if '+' in text or '@' in text:
+        return None
+    if (':' in text or '-' in text) and tag_re.search(text):
+        return None
+
+    return (x, priority, found.get('c_id'), found.get('r_id'), contexts,
+            projects, found.get('p_id'), found.get('a'), found.get('o'),
+            found.get('i'), dates, text.strip())
+
+
+def scan(line):
+    """split a line into its raw fields"""
+    return scan_tokens(line) or scan_regex(line)
+
+
+# dates decoded so far, shared between all tasks
+decoded_dates = {}
+
+
+def decode_date(string):
+    """convert a date string to a date, reusing earlier conversions"""
+    date = decoded_dates.get(string)
+    if date is None:
+        date = decoded_dates[string] = utils.string_to_datetime(string)
+    return date
+
+
+# printed forms of dates, by raw string or date
+date_strings = {}
+
+
+def date_string(value):
+    """return a raw date string or date as printed, formatting each once"""
+    string = date_strings.get(value)
+    if string is None:
+        date = decode_date(value) if type(value) is str else value
+        string = date_strings[value] = date.strftime('%Y-%m-%d')
+    return string
+
+
+def date_field(value):
+    """return a date attribute in its raw string form"""
+    if value is None or type(value) is str:
+        return value
+    return value.isoformat()
+
+
 class Task(object):
-    """task object"""
-    # pylint: disable=too-many-instance-attributes
+    """
+    task object
+
+    dates and the order tag are kept as the raw strings they were read as
+    until first accessed.
+    """
+    __slots__ = ('num', 'source', 'x', 'priority', 'child_id', 'repeat',
+                 'contexts', 'projects', 'parent_id', 'uid', 'text',
+                 'contracted', '_added', '_order', '_done', '_due')
 
     def __init__(self, line):
 
         self.num = 0
-        line, self.x = extract(line, x_re)
-        line, self.priority = extract(line, pri_re)
-        line, self.child_id = extract(line, c_id_re)
-        line, self.repeat = extract(line, r_id_re)
-        line, self.contexts = extract_all(line, c_re)
-        line, self.projects = extract_all(line, p_re)
-        line, self.parent_id = extract(line, p_id_re)
-        line, self.added = extract(line, a_re)
-        line, self.order = extract(line, o_re)
-        line, dates = extract_all(line, date_re)
-        self.text = line.strip()
-        self.done = None
-        self.due = None
-
-        if self.added is not None:
-            self.added = utils.string_to_datetime(self.added)
-
-        dates = [utils.string_to_datetime(d) for d in dates]
+        self.source = None
+        (self.x, self.priority, self.child_id, self.repeat, self.contexts,
+         self.projects, self.parent_id, self._added, self._order, self.uid,
+         dates, self.text) = scan(line)
+        self._done = None
+        self._due = None
+
         if len(dates) == 2:
-            self.done, self.due = dates[0], dates[1]
+            self._done, self._due = dates[0], dates[1]
         elif len(dates) == 1 and self.x is not None:
-            self.done = dates[0]
+            self._done = dates[0]
         elif len(dates) == 1:
-            self.due = dates[0]
-
-        if self.order is not None:
-            self.order = base62.decode(self.order)
+            self._due = dates[0]
 
         if self.parent_id is not None and 'c' in self.parent_id:
             self.parent_id = self.parent_id[:-1]
@@ -82,21 +204,96 @@ class Task(object):
         else:
             self.contracted = False
 
+    @property
+    def added(self):
+        if type(self._added) is str:
+            self._added = decode_date(self._added)
+        return self._added
+
+    @added.setter
+    def added(self, value):
+        self._added = value
+
+    @property
+    def done(self):
+        if type(self._done) is str:
+            self._done = decode_date(self._done)
+        return self._done
+
+    @done.setter
+    def done(self, value):
+        self._done = value
+
+    @property
+    def due(self):
+        if type(self._due) is str:
+            self._due = decode_date(self._due)
+        return self._due
+
+    @due.setter
+    def due(self, value):
+        self._due = value
+
+    @property
+    def order(self):
+        if type(self._order) is str:
+            self._order = base62.decode(self._order)
+        return self._order
+
+    @order.setter
+    def order(self, value):
+        self._order = value
+
+    def fields(self):
+        """return the values of the task as strings, without decoding"""
+        order = self._order
+        if order is not None and type(order) is not str:
+            order = base62.encode(order)
+        return (self.x, self.priority, self.child_id, self.repeat,
+                tuple(self.contexts), tuple(self.projects), self.parent_id,
+                date_field(self._added), order, self.uid,
+                date_field(self._done), date_field(self._due), self.text,
+                self.contracted)
+
+    @classmethod
+    def from_fields(cls, fields):
+        """rebuild a task from the output of fields without parsing"""
+        task = cls.__new__(cls)
+        task.num = 0
+        task.source = None
+        (task.x, task.priority, task.child_id, task.repeat, contexts,
+         projects, task.parent_id, task._added, task._order, task.uid,
+         task._done, task._due, task.text, task.contracted) = fields
+        task.contexts = list(contexts)
+        task.projects = list(projects)
+        return task
+
+    def load(self, *location):
+        """
+        record where the task was read from, along with a hash of its
+        values there
+        """
+        self.source = location + (hash(self.fields()),)
+
+    def changed(self, num):
+        """check if the task no longer matches what it was read from"""
+        return self.order != num or hash(self.fields()) != self.source[-1]
+
     @property
     def num_string(self):
         return '{:>3}'.format(self.num)
 
     @property
     def done_string(self):
-        return self.done.strftime('%Y-%m-%d') if self.done else None
+        return date_string(self._done) if self._done else None
 
     @property
     def due_string(self):
-        return self.due.strftime('%Y-%m-%d') if self.due else None
+        return date_string(self._due) if self._due else None
 
     @property
     def added_string(self):
-        return self.added.strftime('A:%Y-%m-%d') if self.added else None
+        return 'A:' + date_string(self._added) if self._added else None
 
     @property
     def order_string(self):
@@ -132,6 +329,10 @@ class Task(object):
                               'c' if self.contracted else ''])
         return output
 
+    @property
+    def uid_string(self):
+        return 'I:' + self.uid if self.uid else None
+
     @property
     def repeat_string(self):
         output = None
@@ -146,25 +347,50 @@ class Task(object):
             exclusions = []
         self.num = reorder or self.num
 
-        parts = [
-            ('n', 'gray', self.num_string),
-            ('x', 'gray', self.x),
-            ('pr', 'red', self.priority),
-            ('dn', 'gray', self.done_string),
-            ('d', 'orange', self.due_string),
-            ('t', 'white', self.text),
-            ('p', 'blue', self.projects_string),
-            ('c', 'yellow', self.contexts_string),
-            ('r', 'magenta', self.repeat_string),
-            ('a', 'green', self.added_string),
-            ('o', 'gray', self.order_string),
-            ('p_id', 'gray', self.parent_id_string),
-            ('c_id', 'gray', self.child_id_string),
-            ]
-
-        if color:
-            parts = [utils.colorize(s, c) for l, c, s in parts
-                     if l not in exclusions and s]
-        else:
-            parts = [s for l, c, s in parts if l not in exclusions and s]
+        parts = []
+        for get, prefix, suffix in render_plan(color, exclusions):
+            s = get(self)
+            if s:
+                parts.append(prefix + s + suffix)
         return ' '.join(parts)
+
+
+# code, color and attribute of each component of a task line, in order
+components = (
+    ('n', 'gray', 'num_string'),
+    ('x', 'gray', 'x'),
+    ('pr', 'red', 'priority'),
+    ('dn', 'gray', 'done_string'),
+    ('d', 'orange', 'due_string'),
+    ('t', 'white', 'text'),
+    ('p', 'blue', 'projects_string'),
+    ('c', 'yellow', 'contexts_string'),
+    ('r', 'magenta', 'repeat_string'),
+    ('a', 'green', 'added_string'),
+    ('o', 'gray', 'order_string'),
+    ('p_id', 'gray', 'parent_id_string'),
+    ('c_id', 'gray', 'child_id_string'),
+    ('id', 'gray', 'uid_string'),
+    )
+
+# render plans by color setting and exclusions, see render_plan
+render_plans = {}
+
+
+def render_plan(color, exclusions):
+    """
+    return the getter and the codes to put before and after each shown
+    component of a task line. built once for each color setting and list
+    of exclusions.
+    """
+    key = (color, tuple(exclusions))
+    plan = render_plans.get(key)
+    if plan is None:
+        plan = []
+        for code, hue, name in components:
+            if code in exclusions:
+                continue
+            prefix, suffix = utils.color_codes(hue) if color else ('', '')
+            plan.append((operator.attrgetter(name), prefix, suffix))
+        plan = render_plans[key] = tuple(plan)
+    return plan
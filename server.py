@@ -0,0 +1,117 @@
+#!/usr/bin/python
+"""serve taskland commands over a unix socket, and request them from it"""
+
+import os
+import sys
+import json
+import shutil
+import signal
+import socket
+
+# seconds between checks of the list file while waiting for requests
+POLL_INTERVAL = 0.5
+
+# commands that prompt for or read input, and so must run in the calling
+# terminal
+interactive_commands = {'edit', 'rm', 'catch', 'shell', 'serve', 'batch'}
+
+
+def socket_location():
+    """return the path of the server socket"""
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                        '.taskland.sock')
+
+
+def connect():
+    """return a socket connected to the server, or None if it isn't up"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_location())
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    return sock
+
+
+def request(args):
+    """
+    have the server run a command, returning its output.
+
+    returns None if there is no server or the command is interactive.
+    """
+    if interactive_commands.intersection(args):
+        return None
+    sock = connect()
+    if sock is None:
+        return None
+    columns, lines = shutil.get_terminal_size((0, 0))
+    with sock:
+        message = {'args': args, 'columns': columns, 'lines': lines}
+        sock.sendall(json.dumps(message).encode() + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        output = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            output.append(chunk)
+    return b''.join(output).decode()
+
+
+def receive(conn):
+    """read a request from a client connection"""
+    data = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data.append(chunk)
+    return json.loads(b''.join(data).decode())
+
+
+def serve(handle, idle):
+    """
+    answer requests until interrupted.
+
+    handle(args, columns, lines) returns the output of a command. idle() is
+    called between requests and at least every POLL_INTERVAL seconds.
+    """
+    location = socket_location()
+    sock = connect()
+    if sock is not None:
+        sock.close()
+        print('Error: a server is already running')
+        return
+    if os.path.exists(location):
+        os.remove(location)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(location)
+    sock.listen(16)
+    sock.settimeout(POLL_INTERVAL)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit())
+    print('Serving on {}'.format(location))
+    try:
+        while True:
+            idle()
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                conn.settimeout(None)
+                try:
+                    message = receive(conn)
+                except ValueError:
+                    continue
+                output = handle(message['args'], message['columns'],
+                                message['lines'])
+                try:
+                    conn.sendall(output.encode())
+                except BrokenPipeError:
+                    pass
+    except KeyboardInterrupt:
+        print('Server stopped')
+    finally:
+        sock.close()
+        os.remove(location)
@@ -0,0 +1,261 @@
+#!/usr/bin/python
+"""places the task list can be kept"""
+
+import os
+import datetime
+import parse
+import utils
+
+
+class TaskStore(object):
+    """
+    storage of the task list.
+
+    load returns the tasks in stored order along with the positions of the
+    tasks in list order, or None if they have to be sorted. write replaces
+    the stored list with the given tasks, in their order.
+    """
+
+    def load(self):
+        raise NotImplementedError
+
+    def write(self, tasks):
+        raise NotImplementedError
+
+    def stamp(self):
+        """
+        return a stamp of the stored list that changes when it is changed by
+        hand, or None
+        """
+        return None
+
+    def stream(self):
+        """
+        return an iterator building the numbered tasks in list order one at
+        a time, or None if the store can only load them all at once
+        """
+        return None
+
+    def select(self, command_list, limit=None):
+        """
+        return the numbered tasks, in list order, kept by the filter views
+        in command_list, or None if the store can't select them itself
+        """
+        return None
+
+    def done_before(self, date):
+        """check if any task may have been done on or before date"""
+        return True
+
+    def remember_done(self, earliest):
+        """note the earliest done date left in the list after archiving"""
+        pass
+
+
+# list order, as sorted by taskland.sort_key. position is the order tag.
+RANK = ("COALESCE(done, '0001-01-01'), COALESCE(due, '3000-01-01'), "
+        "COALESCE(priority, 'Z'), position")
+
+COLUMNS = ('x', 'priority', 'child_id', 'repeat', 'contexts', 'projects',
+           'parent_id', 'added', 'position', 'uid', 'done', 'due', 'text',
+           'contracted')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    x TEXT,
+    priority TEXT,
+    child_id TEXT,
+    repeat TEXT,
+    contexts TEXT NOT NULL,
+    projects TEXT NOT NULL,
+    parent_id TEXT,
+    added TEXT,
+    uid TEXT,
+    done TEXT,
+    due TEXT,
+    text TEXT NOT NULL,
+    contracted INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS projects (task INTEGER NOT NULL, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS contexts (task INTEGER NOT NULL, name TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due);
+CREATE INDEX IF NOT EXISTS tasks_done ON tasks (done);
+CREATE INDEX IF NOT EXISTS tasks_priority ON tasks (priority);
+CREATE INDEX IF NOT EXISTS tasks_rank ON tasks ({});
+CREATE INDEX IF NOT EXISTS projects_name ON projects (name, task);
+CREATE INDEX IF NOT EXISTS projects_task ON projects (task);
+CREATE INDEX IF NOT EXISTS contexts_name ON contexts (name, task);
+CREATE INDEX IF NOT EXISTS contexts_task ON contexts (task);
+""".format(RANK)
+
+
+def placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+def with_tags(table, strings):
+    """condition on tasks having any of the space separated tags"""
+    names = strings.split(' ')
+    return ('id IN (SELECT task FROM {} WHERE name IN ({}))'.format(
+        table, placeholders(names)), names)
+
+
+def text_holding(strings, joiner):
+    """condition on the text holding the space separated strings"""
+    strings = strings.split(' ')
+    return ('({})'.format(joiner.join(['instr(text, ?) > 0'] * len(strings))),
+            strings)
+
+
+def due_until(date):
+    # undone tasks are written with an empty x rather than none
+    return "due <= ? AND COALESCE(x, '') = ''", [date.isoformat()]
+
+
+# the filter views of taskland as conditions on the tasks table, returning
+# the sql and its parameters
+conditions = {
+    'vc': lambda strings: with_tags('contexts', strings),
+    'vp': lambda strings: with_tags('projects', strings),
+    'any': lambda strings: text_holding(strings, ' OR '),
+    'all': lambda strings: text_holding(strings, ' AND '),
+    'excl': lambda strings: ('NOT ' + text_holding(strings, ' OR ')[0],
+                             strings.split(' ')),
+    'today': lambda: due_until(utils.today()),
+    'week': lambda: due_until(utils.today() +
+                              datetime.timedelta(7)),
+    'until': lambda string: due_until(utils.code_to_datetime(string)),
+    }
+
+
+class SQLiteStore(TaskStore):
+    """
+    the task list kept in an sqlite database.
+
+    projects and contexts are kept in tables of their own, and tasks are
+    indexed by due date, done date, priority and list order, so filter
+    views are answered by the database without reading the whole list.
+    """
+
+    def __init__(self, location):
+        self.location = location
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            import sqlite3
+            db = self._connection = sqlite3.connect(self.location)
+            db.executescript(SCHEMA)
+            # databases made before tasks had ids
+            if 'uid' not in [c[1] for c in
+                             db.execute('PRAGMA table_info(tasks)')]:
+                db.execute('ALTER TABLE tasks ADD COLUMN uid TEXT')
+            db.execute('CREATE INDEX IF NOT EXISTS tasks_uid ON tasks (uid)')
+        return self._connection
+
+    def stamp(self):
+        try:
+            stat = os.stat(self.location)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def task(self, row):
+        """rebuild a task from a row holding COLUMNS"""
+        (x, priority, child_id, repeat, contexts, projects, parent_id, added,
+         position, uid, done, due, text, contracted) = row
+        return parse.Task.from_fields((
+            x, priority, child_id, repeat, contexts.split(), projects.split(),
+            parent_id, added, position, uid, done, due, text,
+            bool(contracted)))
+
+    def load(self):
+        rows = self.connection.execute(
+            'SELECT id, ROW_NUMBER() OVER (ORDER BY {}), {} FROM tasks '
+            'ORDER BY position'.format(RANK, ', '.join(COLUMNS)))
+        tasks = []
+        ordering = []
+        for i, row in enumerate(rows):
+            t = self.task(row[2:])
+            t.load(row[0])
+            tasks.append(t)
+            ordering.append((row[1], i))
+        ordering.sort()
+        return tasks, [i for _, i in ordering]
+
+    def write(self, tasks):
+        db = self.connection
+        with db:
+            kept = set()
+            for i, t in enumerate(tasks):
+                if t.source is not None:
+                    kept.add(t.source[0])
+                    if not t.changed(i+1):
+                        continue
+                (x, priority, child_id, repeat, contexts, projects, parent_id,
+                 added, _, uid, done, due, text, contracted) = t.fields()
+                contexts = ' '.join(contexts)
+                projects = ' '.join(projects)
+                row = (x, priority, child_id, repeat, contexts, projects,
+                       parent_id, added, i+1, uid, done, due, text,
+                       contracted)
+                if t.source is None:
+                    task_id = db.execute(
+                        'INSERT INTO tasks ({}) VALUES ({})'.format(
+                            ', '.join(COLUMNS), placeholders(COLUMNS)),
+                        row).lastrowid
+                    kept.add(task_id)
+                else:
+                    task_id = t.source[0]
+                    tags = db.execute(
+                        'SELECT contexts, projects FROM tasks WHERE id = ?',
+                        (task_id,)).fetchone()
+                    db.execute('UPDATE tasks SET {} WHERE id = ?'.format(
+                        ', '.join(c + ' = ?' for c in COLUMNS)),
+                        row + (task_id,))
+                    if tags == (contexts, projects):
+                        continue
+                for table, names in (('contexts', contexts.split()),
+                                     ('projects', projects.split())):
+                    db.execute('DELETE FROM {} WHERE task = ?'.format(table),
+                               (task_id,))
+                    db.executemany(
+                        'INSERT INTO {} VALUES (?, ?)'.format(table),
+                        [(task_id, n) for n in names])
+            removed = [(r,) for r, in db.execute('SELECT id FROM tasks')
+                       if r not in kept]
+            for table in ('contexts', 'projects'):
+                db.executemany('DELETE FROM {} WHERE task = ?'.format(table),
+                               removed)
+            db.executemany('DELETE FROM tasks WHERE id = ?', removed)
+
+    def select(self, command_list, limit=None):
+        if not all(command in conditions for command, _ in command_list):
+            return None
+        clauses = []
+        parameters = []
+        for command, args in command_list:
+            clause, values = conditions[command](*args)
+            clauses.append(clause)
+            parameters.extend(values)
+        query = ('SELECT num, {0} FROM (SELECT *, ROW_NUMBER() OVER '
+                 '(ORDER BY {1}) AS num FROM tasks) WHERE {2} '
+                 'ORDER BY num'.format(', '.join(COLUMNS), RANK,
+                                       ' AND '.join(clauses) or '1'))
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(limit)
+        tasks = []
+        for row in self.connection.execute(query, parameters):
+            t = self.task(row[1:])
+            t.num = row[0]
+            tasks.append(t)
+        return tasks
+
+    def done_before(self, date):
+        return self.connection.execute(
+            'SELECT 1 FROM tasks WHERE done <= ? LIMIT 1',
+            (date.isoformat(),)).fetchone() is not None
@@ -0,0 +1,239 @@
+#!/usr/bin/python
+"""the parsed task list as columns of numbers, for sorting and counting"""
+
+import array
+import bisect
+import collections
+import datetime
+import base62
+import parse
+
+# positions of values in parse.Task.fields
+X, PRIORITY, CONTEXTS, PROJECTS, ADDED, ORDER, DONE, DUE = (
+    0, 1, 4, 5, 7, 8, 10, 11)
+
+# values standing in for a missing one in the sort order, as in
+# taskland.sort_key
+NO_DONE = datetime.date(1, 1, 1).toordinal()
+NO_DUE = datetime.date(3000, 1, 1).toordinal()
+# past every letter, as 'Z' sorts after any '(A)'
+NO_PRIORITY = 0x110000
+NO_ORDER = 9**9
+
+# lists at least this long are worked on with numpy, if it is installed.
+# loading it takes about as long as it saves in sorting this many tasks
+NUMPY_ROWS = 100000
+
+# ordinals of date strings converted so far
+ordinals = {}
+
+
+def ordinal(string):
+    """return the ordinal of a date string, or 0 for None"""
+    if string is None:
+        return 0
+    value = ordinals.get(string)
+    if value is None:
+        value = ordinals[string] = parse.decode_date(string).toordinal()
+    return value
+
+
+# the arrays of numbers a table keeps, by name: their typecode and the
+# value of each row, from its fields
+columns = {
+    'finished': ('b', lambda f: 1 if f[X] else 0),
+    'priority': ('l', lambda f: ord(f[PRIORITY][1]) if f[PRIORITY]
+                 else NO_PRIORITY),
+    'order': ('l', lambda f: base62.decode(f[ORDER]) if f[ORDER] else 0),
+    'done': ('l', lambda f: ordinal(f[DONE])),
+    'due': ('l', lambda f: ordinal(f[DUE])),
+    'added': ('l', lambda f: ordinal(f[ADDED])),
+    }
+
+
+def load_numpy(rows):
+    """return numpy if it is installed and worth loading for rows"""
+    if rows < NUMPY_ROWS:
+        return None
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class TaskTable(object):
+    """
+    the parsed fields of the tasks of a list, one row per task, with the
+    values used to sort, filter and count them kept in arrays.
+
+    dates are kept as ordinals, 0 for none, priorities as the code of their
+    letter, and projects and contexts as numbers standing for their names.
+    the arrays are built as they are first needed, and worked on with
+    numpy for long lists if it is installed, and in python otherwise.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.numpy = load_numpy(len(fields))
+        self.built = {}
+        self.tags = {}
+
+    def __len__(self):
+        return len(self.fields)
+
+    def column(self, name):
+        """return a column, building it on first use"""
+        values = self.built.get(name)
+        if values is None:
+            typecode, value = columns[name]
+            values = self.built[name] = array.array(
+                typecode, map(value, self.fields))
+        return values
+
+    def tagged(self, kind):
+        """
+        return the names of the projects or contexts of the tasks, along
+        with the numbers of the names each row has, flattened, and the
+        start of the numbers of each row, followed by their end.
+        """
+        if kind not in self.tags:
+            position = PROJECTS if kind == 'projects' else CONTEXTS
+            names = []
+            numbers = {}
+            ids = array.array('l')
+            starts = array.array('l', [0])
+            for f in self.fields:
+                # a name given twice on a task counts once
+                for name in dict.fromkeys(f[position]):
+                    number = numbers.get(name)
+                    if number is None:
+                        number = numbers[name] = len(names)
+                        names.append(name)
+                    ids.append(number)
+                starts.append(len(ids))
+            self.tags[kind] = names, ids, starts
+        return self.tags[kind]
+
+    def names(self, kind):
+        """
+        return the projects or contexts of the tasks, sorted as
+        utils.projects_get sorts them
+        """
+        return sorted(self.tagged(kind)[0], key=lambda s: s.lower())
+
+    def ordering(self):
+        """return the rows in list order, as taskland.sort_key sorts them"""
+        done, due, priority, order = (self.column(name) for name in
+                                      ('done', 'due', 'priority', 'order'))
+        np = self.numpy
+        if np:
+            done, due, order = (np.asarray(c) for c in (done, due, order))
+            return np.lexsort((
+                np.arange(len(self)),
+                np.where(order == 0, NO_ORDER, order),
+                np.asarray(priority),
+                np.where(due == 0, NO_DUE, due),
+                np.where(done == 0, NO_DONE, done))).tolist()
+        keys = list(zip((d or NO_DONE for d in done),
+                        (d or NO_DUE for d in due),
+                        priority,
+                        (o or NO_ORDER for o in order)))
+        return sorted(range(len(keys)), key=keys.__getitem__)
+
+    def dues(self, ordering):
+        """
+        return the due dates of the unfinished tasks as ordinals in an array
+        sorted by date, along with an array of the positions of the tasks
+        in list order. ordering is the rows in list order.
+        """
+        due, finished = self.column('due'), self.column('finished')
+        np = self.numpy
+        if np:
+            due = np.asarray(due)[ordering]
+            kept = np.flatnonzero((due != 0) &
+                                  (np.asarray(finished)[ordering] == 0))
+            kept = kept[np.argsort(due[kept], kind='stable')]
+            return (array.array('l', due[kept].tolist()),
+                    array.array('l', kept.tolist()))
+        dated = sorted((due[row], position)
+                       for position, row in enumerate(ordering)
+                       if due[row] and not finished[row])
+        return (array.array('l', [date for date, _ in dated]),
+                array.array('l', [position for _, position in dated]))
+
+    def due_before(self, date):
+        """return the rows of the unfinished tasks due before a date"""
+        cutoff = date.toordinal()
+        due, finished = self.column('due'), self.column('finished')
+        np = self.numpy
+        if np:
+            due = np.asarray(due)
+            return np.flatnonzero((due != 0) & (due < cutoff) &
+                                  (np.asarray(finished) == 0)).tolist()
+        return [row for row, day in enumerate(due)
+                if day and day < cutoff and not finished[row]]
+
+    def counts(self, kind, rows=None):
+        """
+        return the number of tasks having each project or context, by name,
+        among rows or all of the tasks
+        """
+        names, ids, starts = self.tagged(kind)
+        np = self.numpy
+        if np:
+            ids = np.asarray(ids)
+            if rows is not None:
+                chosen = np.zeros(len(self), dtype=bool)
+                chosen[rows] = True
+                ids = ids[np.repeat(chosen, np.diff(np.asarray(starts)))]
+            counted = np.bincount(ids, minlength=len(names)).tolist()
+            return {name: count for name, count in zip(names, counted)
+                    if count}
+        if rows is None:
+            counted = collections.Counter(ids)
+        else:
+            counted = collections.Counter(
+                ids[i] for row in rows
+                for i in range(starts[row], starts[row+1]))
+        return {names[number]: count for number, count in counted.items()}
+
+    def done_days(self):
+        """return the number of finished tasks done each day, by ordinal"""
+        done, finished = self.column('done'), self.column('finished')
+        np = self.numpy
+        if np:
+            done = np.asarray(done)
+            days, counted = np.unique(
+                done[(done != 0) & (np.asarray(finished) == 1)],
+                return_counts=True)
+            return dict(zip(days.tolist(), counted.tolist()))
+        return collections.Counter(day for row, day in enumerate(done)
+                                   if day and finished[row])
+
+    def ages(self, date, bounds):
+        """
+        return the number of unfinished tasks added fewer days before a date
+        than each of the sorted bounds and no fewer than the one before it,
+        followed by the number added longer ago and the number without an
+        added date
+        """
+        cutoff = date.toordinal()
+        added, finished = self.column('added'), self.column('finished')
+        np = self.numpy
+        if np:
+            added = np.asarray(added)[np.asarray(finished) == 0]
+            dated = added[added != 0]
+            counted = np.bincount(
+                np.searchsorted(bounds, cutoff - dated, side='right'),
+                minlength=len(bounds) + 1).tolist()
+            return counted + [len(added) - len(dated)]
+        counted = [0] * (len(bounds) + 2)
+        for row, day in enumerate(added):
+            if finished[row]:
+                continue
+            if day:
+                counted[bisect.bisect_right(bounds, cutoff - day)] += 1
+            else:
+                counted[-1] += 1
+        return counted
@@ -11,15 +11,28 @@ Description: cli todolist program
 
 import sys
 import os
-import time
+import io
+import re
+import itertools
+import bisect
 import collections
 import datetime
 import config
+import base62
+import cache
+import index
+import lock
 import parse
+import table
 import views
 import actions
+import store
 import utils
 
+# modules only some commands need are imported where they are used, so that
+# views start quickly: archive, journal, server, and the standard modules
+# for writing, prompting and serving
+
 __location__ = os.path.realpath(
     os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
@@ -27,56 +40,327 @@ defaults = {
     'list_location': 'todo.txt',
     'default_command': 'h',
     'default_view': 'hide o p_id c_id a',
+    'show_ids': 'false',
     'archive_location': 'archive.txt',
     'archive_automatically': 'false',
-    'archive_delay': '2'
+    'archive_delay': '2',
+    'archive_segments': 'false',
+    'cache': 'true',
+    'storage': 'text',
+    'database_location': 'todo.db'
     }
 
-settings = config.process_config(__location__, defaults)
+# read from config.rc by load_settings
+settings = dict(defaults)
 
+# size and mtime of the list file when it was last read, and its line count
+loaded = {}
 
-def open_list():
-    """open and read the task list file"""
-    list_location = os.path.dirname(__file__) + "/" + settings['list_location']
+# parsed list kept in memory while running as a server, by the version of
+# the list it was read at, see keep_resident
+resident = {}
+
+# the store.TaskStore in use, see task_store
+stores = {}
+
+# stamp of the list file and the lines holding each task id, see line_ids
+id_index = {}
+
+# version of the list and the due dates of its unfinished tasks, see
+# due_positions
+due_index = {}
+
+# the lock.ListLock of the list, see list_lock
+locks = {}
+
+
+def list_path():
+    """return the path of the task list file"""
+    return os.path.dirname(__file__) + "/" + settings['list_location']
+
+
+def read_list():
+    """read the raw contents of the task list file, creating it if needed"""
     try:
-        with open(list_location, 'r') as f:
-            file = f.readlines()
+        with open(list_path(), 'rb') as f:
+            data = f.read()
     except FileNotFoundError:
-        with open(list_location, 'w+') as f:
-            file = f.readlines()
-    return file
+        with open(list_path(), 'w+'):
+            data = b''
+    return data
+
+
+def split_lines(data):
+    """split raw list contents into lines as a text mode read would"""
+    return io.TextIOWrapper(io.BytesIO(data)).readlines()
+
+
+def open_list():
+    """open and read the task list file"""
+    return split_lines(read_list())
 
 
 def print_projects():
     """print all projects represented in the task list"""
-    tasks = collect_tasks()
-    print('\n'.join(utils.projects_get(tasks)))
+    print('\n'.join(tag_names('projects')))
 
 
 def print_contexts():
     """print all contexts represented in the task list"""
+    print('\n'.join(tag_names('contexts')))
+
+
+def tag_names(kind):
+    """
+    return the projects or contexts of the list, sorted. they are read from
+    its table when it can be had, without building its tasks.
+    """
+    tasks = list_table()
+    if tasks is not None:
+        return tasks.names(kind)
     tasks = collect_tasks()
-    print('\n'.join(utils.contexts_get(tasks)))
+    if kind == 'projects':
+        return utils.projects_get(tasks)
+    return utils.contexts_get(tasks)
+
+
+def list_table():
+    """
+    return the list as a table.TaskTable, if it is kept in the list file
+    and already parsed, and no task is due to be archived. returns None
+    otherwise.
+    """
+    if settings['storage'] != 'text':
+        return None
+    if (settings['archive_automatically'] == 'true' and
+            archive_pending()):
+        return None
+    parsed = parsed_list()
+    if parsed is None:
+        return None
+    return table.TaskTable(parsed[1])
 
 
-def collect_tasks():
-    """parse task list file into task objects, order, and return in a list"""
-    todolist = open_list()
-    tasks = [parse.Task(l) for l in todolist]
+# tasks at the top of the list offered by number in the vocabulary
+vocabulary_tasks = 100
+
+# kinds of completions in the vocabulary, by the letter their lines begin
+vocabulary_kinds = {'projects': 'p', 'contexts': 'c', 'tasks': 'n',
+                    'parents': 's'}
+
+
+def vocabulary_path():
+    """return the path of the vocabulary of completions"""
+    return cache.cache_location(store_path(), 'words')
+
+
+def vocabulary_lines(tasks, key=None):
+    """
+    return the lines of the vocabulary of the list: its projects and
+    contexts, and the numbers of the first tasks of the list and of the
+    unfinished parent tasks, described by their text. each line is a
+    letter of vocabulary_kinds, a space, and the completion. key places a
+    task in the list, sort_key by default.
+    """
+    if key is None:
+        key = sort_key
+    lines = ['p ' + p for p in utils.projects_get(tasks)]
+    lines += ['c ' + c for c in utils.contexts_get(tasks)]
+    # tasks is in file order, whose stable sort is the list order
+    tasks = sorted(tasks, key=key)
+    lines += ['n {}:{}'.format(i+1, t.text[:40]) for i, t in
+              enumerate(tasks[:vocabulary_tasks])]
+    lines += ['s {}:{}'.format(i+1, t.text[:40]) for i, t in enumerate(tasks)
+              if t.parent_id is not None and t.x is None]
+    return lines
+
+
+def save_vocabulary(tasks):
+    """
+    write the vocabulary for the tasks just written, once it is in use,
+    having been made by print_completions
+    """
+    if not os.path.exists(vocabulary_path()):
+        return
+    # the tasks are read back with their position as their order tag, as
+    # settle_tasks orders them, which setabove and setbelow rely on
+    positions = {id(t): i+1 for i, t in enumerate(tasks)}
+
+    def written_key(t):
+        return sort_key(t)[:3] + (positions[id(t)],)
+
+    cache.save_text(store_path(), 'words', vocabulary_lines(tasks,
+                                                             written_key))
+
+
+def drop_vocabulary():
+    """remove the vocabulary, for the list was changed without all of it"""
+    try:
+        os.remove(vocabulary_path())
+    except FileNotFoundError:
+        pass
+
+
+def print_completions(args):
+    """
+    print the completions of a kind, projects, contexts, tasks or parents,
+    from the vocabulary of the list. the vocabulary is made again if the
+    list was changed since it was written, or if there is none.
+    """
+    if args and args[0] not in vocabulary_kinds:
+        print('Error: {} is not a kind of completion'.format(args[0]))
+        return
+    location = vocabulary_path()
+    try:
+        fresh = (os.stat(location).st_mtime_ns >=
+                 os.stat(store_path()).st_mtime_ns)
+    except FileNotFoundError:
+        fresh = False
+    if fresh:
+        with open(location) as f:
+            lines = f.read().splitlines()
+    else:
+        lines = vocabulary_lines(collect_tasks())
+        cache.save_text(store_path(), 'words', lines)
+    if args:
+        prefix = vocabulary_kinds[args[0]] + ' '
+        for line in lines:
+            if line.startswith(prefix):
+                print(line[2:])
+
+
+def sort_key(task):
+    """return the key that places a task in the list"""
+    return (task.done or datetime.date(1, 1, 1),
+            task.due or datetime.date(3000, 1, 1),
+            task.priority or 'Z',
+            task.order or 9**9)
+
+
+def sort_tasks(tasks):
+    """return tasks in list order"""
+    return sorted(tasks, key=sort_key)
+
+
+def parse_list(data):
+    """
+    return the tasks in raw list contents in file order, along with their
+    sorted order.
+
+    uses the parsed task cache when it matches data, and rebuilds it
+    otherwise.
+    """
+    use_cache = settings['cache'] == 'true'
+    cached = cache.load(list_path(), data) if use_cache else None
+    if cached is not None:
+        fields, ordering = cached
+        return [parse.Task.from_fields(f) for f in fields], ordering
+
+    tasks = [parse.Task(l) for l in split_lines(data)]
+    fields = [t.fields() for t in tasks]
+    ordering = table.TaskTable(fields).ordering()
+    if use_cache:
+        cache.save(list_path(), data, fields, ordering)
+    return tasks, ordering
+
+
+def line_spans(data):
+    """return the byte offset and length of each line in raw list contents"""
+    spans = []
+    offset = 0
+    for raw in data.splitlines(True):
+        spans.append((offset, len(raw)))
+        offset += len(raw)
+    return spans
+
+
+def list_stamp():
+    """return the mtime and size of the list file, creating it if needed"""
+    try:
+        stat = os.stat(list_path())
+    except FileNotFoundError:
+        read_list()
+        stat = os.stat(list_path())
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_tasks():
+    """
+    read the list file and return its tasks in file order along with their
+    sorted order.
+
+    when resident, the parsed list is kept in memory and reused for as long
+    as the list keeps its version.
+    """
+    version = list_version()
+    stamp = version[1]
+    kept = resident_list(version)
+    if kept is not None:
+        fields, ordering, spans = kept
+        tasks = [parse.Task.from_fields(f) for f in fields]
+    else:
+        data = read_list()
+        tasks, ordering = parse_list(data)
+        spans = line_spans(data)
+        if resident:
+            resident['version'] = version
+            resident['list'] = ([t.fields() for t in tasks], ordering, spans)
+
+    for i, (t, (offset, length)) in enumerate(zip(tasks, spans)):
+        t.load(i, offset, length)
+    loaded['stamp'] = stamp
+    loaded['count'] = len(tasks)
+    return tasks, ordering
+
+
+def build_tasks(fields, ordering):
+    """yield the numbered tasks of parsed fields in list order"""
+    for num, i in enumerate(ordering, 1):
+        t = parse.Task.from_fields(fields[i])
+        t.num = num
+        yield t
+
+
+def keep_resident():
+    """keep the parsed list in memory from now on, reloading it if changed"""
+    if settings['storage'] != 'text':
+        return
+    resident.setdefault('version', None)
+    if resident_list(list_version()) is None:
+        load_tasks()
+
+
+def resident_list(version):
+    """
+    return the (fields, ordering, spans) of the list kept in memory, if it
+    is of the given list_version, or None
+    """
+    if resident and resident['version'] == version:
+        return resident['list']
+    return None
+
+
+def collect_tasks(ordered=True):
+    """
+    parse task list file into task objects, order, and return in a list
+
+    if ordered is False the tasks are left in file order, unnumbered.
+    """
+    loaded['version'] = list_version()
+    tasks, ordering = task_store().load()
 
     # archive tasks that are too old
     if settings['archive_automatically'] == 'true':
-        delay = int(settings['archive_delay'])
-        tasks = archive_done(tasks, delay)
-        write_tasks(tasks)
-
-    tasks = sorted(tasks, key=lambda t: t.order if t.order else 9**9)
-    tasks = sorted(tasks, key=lambda t: t.priority if t.priority else 'Z')
-    tasks = sorted(tasks, key=lambda t: t.due if t.due else
-                   datetime.date(3000, 1, 1))
-    tasks = sorted(tasks, key=lambda t: t.done if t.done else
-                   datetime.date(1, 1, 1))
+        remaining = archive_automatically(tasks)
+        if len(remaining) != len(tasks):
+            tasks, ordering = remaining, None
 
+    if not ordered:
+        return tasks
+    if ordering is None:
+        tasks = sort_tasks(tasks)
+    else:
+        tasks = [tasks[i] for i in ordering]
     for i, t in enumerate(tasks):
         t.num = i+1
 
@@ -88,47 +372,770 @@ def add_warning(*_):
     raise KeyError
 
 
-def write_tasks(tasks):
-    """write the list of task objects to the task list file"""
-    list_location = os.path.dirname(__file__) + "/" + settings['list_location']
+def encode_line(task, num):
+    """compose a task as a line of the list file in its file encoding"""
+    import locale
+    line = task.compose_line(False, ['n'], num) + '\n'
+    return line.encode(locale.getpreferredencoding(False))
+
+
+def list_changes(tasks):
+    """
+    return the line patches and appended lines that turn the list file into
+    tasks, or None if the file must be rewritten in full.
+
+    patches are (offset, length, line) tuples for lines whose task has
+    changed. this is only possible while the file is as it was read and the
+    tasks read from it are still in file order, followed by any new ones.
+    """
+    try:
+        stat = os.stat(list_path())
+    except FileNotFoundError:
+        return None
+    if loaded.get('stamp') != (stat.st_mtime_ns, stat.st_size):
+        return None
+
+    patches = []
+    appended = []
+    for i, t in enumerate(tasks):
+        if t.source is None:
+            appended.append(encode_line(t, i+1))
+        elif appended or t.source[0] != i:
+            return None
+        elif t.changed(i+1):
+            patches.append((t.source[1], t.source[2], encode_line(t, i+1)))
+    if len(tasks) - len(appended) != loaded['count']:
+        return None
+
+    if appended and stat.st_size and not ends_with_newline():
+        return None
+    return patches, appended
+
+
+def ends_with_newline():
+    """check if the last line of the list file is ended"""
+    with open(list_path(), 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def patch_list(patches, appended):
+    """
+    apply line patches and append new lines to the list file.
+
+    while every patched line keeps its length, lines are overwritten in
+    place. otherwise the list is written anew through a temporary file, so
+    that an interrupted write leaves the old list whole.
+    """
+    if any(len(line) != length for _, length, line in patches):
+        with open(list_path(), 'rb') as f:
+            data = f.read()
+        parts = []
+        start = 0
+        for offset, length, line in patches:
+            parts.append(data[start:offset])
+            parts.append(line)
+            start = offset + length
+        parts.append(data[start:])
+        temp = list_path() + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(b''.join(parts + appended))
+        install_list(temp)
+        return
+    with open(list_path(), 'r+b') as f:
+        for offset, length, line in patches:
+            f.seek(offset)
+            f.write(line)
+        if appended:
+            f.seek(0, os.SEEK_END)
+            f.write(b''.join(appended))
+
+
+def replace_list(tasks):
+    """write the whole list file through a temporary file"""
+    temp = list_path() + '.tmp'
     lines = [t.compose_line(False, ['n'], i+1) for i, t in enumerate(tasks)]
-    with open(list_location, "w") as f:
+    with open(temp, "w") as f:
         for line in lines:
             f.write(line + '\n')
+    install_list(temp)
 
 
-def archive_done(tasks, delay):
-    """remove tasks marked done from the task list and write to archive file"""
-    archive_location = os.path.dirname(__file__) + "/" + settings['archive_location']
-    to_go = [t for t in tasks if t.done and datetime.date.today() >=
-             t.done + datetime.timedelta(delay)]
-    to_stay = [t for t in tasks if t not in to_go]
-    to_go_lines = [t.compose_line(False, ['n']) for t in to_go]
+def install_list(temp):
+    """put a file written beside the list file in its place"""
+    location = list_path()
+    if os.path.exists(location):
+        import shutil
+        shutil.copymode(location, temp)
+    os.replace(temp, location)
+
+
+def write_tasks(tasks, highest_id=0):
+    """
+    write the list of task objects to the task store. highest_id is the
+    highest of the ids given to its tasks already, as a number.
+    """
+    with list_lock() as held:
+        highest_id = max(highest_id, assign_ids(tasks))
+        task_store().write(tasks)
+        held.written(highest_id)
+        loaded['version'] = list_version()
+        save_vocabulary(tasks)
+
+
+def store_path():
+    """return the path of the file the task store keeps the list in"""
+    if settings['storage'] == 'sqlite':
+        return database_path()
+    return list_path()
+
+
+def list_lock():
+    """return the lock.ListLock of the list, kept beside the store"""
+    if 'lock' not in locks:
+        locks['lock'] = lock.ListLock(cache.cache_location(store_path(),
+                                                           'lock'))
+    return locks['lock']
+
+
+def list_version():
+    """
+    return the version of the stored list, which changes with every write:
+    the count of writes kept by the list lock, and the stamp of the store
+    for changes made by hand
+    """
+    return list_lock().count(), task_store().stamp()
+
+
+def update_tasks(change, prompting=False, tasks=None):
+    """
+    read the list, pass its tasks through change and write the result,
+    holding the list lock throughout so that writers in other processes
+    wait their turn. returns the tasks written.
+
+    if change prompts for input, the lock is only held to write, and if the
+    list was written meanwhile change is applied again to the list as it
+    now is.
+
+    tasks, if given, is the list as this process last read or wrote it, and
+    is used instead of reading the list again unless it was written since.
+    """
+    if not prompting:
+        with list_lock():
+            if tasks is None or list_version() != loaded['version']:
+                tasks = collect_tasks()
+            tasks = change(tasks)
+            write_tasks(tasks)
+        return tasks
+    while True:
+        if tasks is None or list_version() != loaded['version']:
+            tasks = collect_tasks()
+        version = loaded['version']
+        tasks = change(tasks)
+        with list_lock():
+            if list_version() == version:
+                write_tasks(tasks)
+                return tasks
+        print('The list was changed meanwhile, applying the commands again')
+
+
+def next_uid(uids):
+    """return the number following the highest of the base62 ids"""
+    highest = 0
+    for uid in uids:
+        try:
+            highest = max(highest, base62.decode(uid))
+        except ValueError:
+            pass
+    return highest + 1
+
+
+def first_uid(uids):
+    """
+    return the first id to give out: past the base62 ids in the list and
+    every id given out before, kept by the list lock
+    """
+    return max(next_uid(uids), list_lock().highest_id() + 1)
+
+
+def assign_ids(tasks):
+    """
+    give each task without an id one that no task has had yet. returns the
+    highest id given, as a number, or 0.
+    """
+    new = [t for t in tasks if t.uid is None]
+    if not new:
+        return 0
+    uid = first_uid(t.uid for t in tasks if t.uid is not None)
+    for i, t in enumerate(new):
+        t.uid = base62.encode(uid + i)
+    return uid + len(new) - 1
+
+
+uid_re = re.compile(rb'(?:^| )I:(\w+)(?=[ \r]|$)')
+
+
+def index_ids(data):
+    """
+    return the offset and length of the line holding each task id in raw
+    list contents, found without parsing the lines. ids found on more than
+    one line map to None.
+    """
+    lines = {}
+    offset = 0
+    search = uid_re.search
+    for line in data.split(b'\n'):
+        length = len(line) + 1
+        match = search(line) if b'I:' in line else None
+        if match:
+            uid = match.group(1).decode()
+            lines[uid] = None if uid in lines else (offset, length)
+        offset += length
+    return lines
+
+
+def line_ids():
+    """
+    return the offset and length of the line holding each task id in the
+    list file. kept in memory and beside the list file, and rebuilt when
+    the list is written.
+    """
+    stamp = list_version()
+    if id_index.get('stamp') != stamp:
+        found, lines = cache.load_marker(list_path(), 'ids', stamp)
+        if not found:
+            lines = index_ids(read_list())
+            cache.save_marker(list_path(), 'ids', stamp, lines)
+        id_index['stamp'] = stamp
+        id_index['lines'] = lines
+    return id_index['lines']
+
+
+def parsed_list():
+    """
+    return the version of the list file and its parsed fields and sorted
+    ordering, if it is already parsed, in memory or in the cache. returns
+    None otherwise.
+    """
+    version = list_version()
+    kept = resident_list(version)
+    if kept is not None:
+        fields, ordering, _ = kept
+    else:
+        cached = None
+        if settings['cache'] == 'true':
+            cached = cache.load(list_path(), read_list())
+        if cached is None:
+            return None
+        fields, ordering = cached
+    return version, fields, ordering
+
+
+def due_positions(version, fields, ordering, cutoff):
+    """
+    return the positions in list order of the unfinished tasks due by the
+    cutoff date, in list order. the due dates are searched rather than
+    scanned, and kept in memory and beside the list file until it changes.
+    """
+    if due_index.get('version') != version:
+        found, dues = cache.load_marker(list_path(), 'dues', version)
+        if not found:
+            dues = table.TaskTable(fields).dues(ordering)
+            cache.save_marker(list_path(), 'dues', version, dues)
+        due_index['version'] = version
+        due_index['dues'] = dues
+    dates, positions = due_index['dues']
+    return sorted(positions[:bisect.bisect_right(dates, cutoff.toordinal())])
+
+
+class TextStore(store.TaskStore):
+    """the task list kept in the todo.txt list file"""
+
+    def load(self):
+        return load_tasks()
+
+    def stamp(self):
+        return list_stamp()
+
+    def stream(self):
+        # only possible when the list is already parsed
+        parsed = parsed_list()
+        if parsed is None:
+            return None
+        _, fields, ordering = parsed
+        return build_tasks(fields, ordering)
+
+    def select(self, command_list, limit=None):
+        # only filter views on due dates narrow the tasks to build
+        cutoffs = [due_cutoffs[command](*args)
+                   for command, args in command_list
+                   if command in due_cutoffs]
+        if not cutoffs:
+            return None
+        parsed = parsed_list()
+        if parsed is None:
+            return None
+        version, fields, ordering = parsed
+        predicates = filter_predicates_of(command_list)
+        tasks = []
+        for position in due_positions(version, fields, ordering,
+                                      min(cutoffs)):
+            if len(tasks) == limit:
+                break
+            t = parse.Task.from_fields(fields[ordering[position]])
+            t.num = position + 1
+            if all(predicate(t) for predicate in predicates):
+                tasks.append(t)
+        return tasks
+
+    def write(self, tasks):
+        changes = list_changes(tasks)
+        if changes is None:
+            replace_list(tasks)
+        elif any(changes):
+            patch_list(*changes)
+        # the lines read have moved, so a later write replaces the list
+        loaded['stamp'] = None
+
+    def done_before(self, date):
+        # the earliest done date is remembered for as long as the list
+        # file is unchanged
+        found, earliest = cache.load_marker(list_path(), 'archive',
+                                            list_stamp())
+        return not found or (earliest is not None and
+                             earliest <= date.toordinal())
+
+    def remember_done(self, earliest):
+        cache.save_marker(list_path(), 'archive', list_stamp(),
+                          earliest.toordinal() if earliest else None)
+
+
+def database_path():
+    """return the path of the database used when storage is sqlite"""
+    return os.path.dirname(__file__) + "/" + settings['database_location']
+
+
+def task_store():
+    """return the store holding the task list, as set by 'storage'"""
+    if 'store' not in stores:
+        if settings['storage'] == 'sqlite':
+            stores['store'] = store.SQLiteStore(database_path())
+        else:
+            stores['store'] = TextStore()
+    return stores['store']
+
+
+def partition_done(tasks, delay):
+    """
+    split tasks into those staying in the list and those done at least
+    delay days ago, in one pass. also returns the earliest done date among
+    the staying tasks, or None.
+    """
+    cutoff = utils.today() - datetime.timedelta(delay)
+    to_stay = []
+    to_go = []
+    earliest = None
+    for t in tasks:
+        done = t.done
+        if not done:
+            to_stay.append(t)
+        elif done <= cutoff:
+            to_go.append(t)
+        else:
+            to_stay.append(t)
+            if earliest is None or done < earliest:
+                earliest = done
+    return to_stay, to_go, earliest
+
+
+def archive_path():
+    """return the path of the archive file"""
+    return os.path.dirname(__file__) + "/" + settings['archive_location']
+
+
+def archive_store():
+    """return the segmented archive, kept in a folder named after the file"""
+    import archive
+    return archive.ArchiveStore(os.path.splitext(archive_path())[0])
+
+
+def archive_tasks(tasks):
+    """append tasks to the archive file, or the segmented archive"""
+    if settings['archive_segments'] == 'true':
+        archive_store().add(tasks)
+        return
+    archive_location = archive_path()
+    to_go_lines = [t.compose_line(False, ['n']) for t in tasks]
     with open(archive_location, "a") as f:
         for line in to_go_lines:
             f.write(line + '\n')
+
+
+def archive_done(tasks, delay):
+    """remove tasks marked done from the task list and write to archive file"""
+    to_stay, to_go, _ = partition_done(tasks, delay)
+    if to_go:
+        archive_tasks(to_go)
     return to_stay
 
 
+def archive_automatically(tasks):
+    """
+    archive done tasks older than the archive delay and rewrite the list.
+
+    the store is asked first if any task can be due for archiving, which the
+    list file answers from the earliest done date left by the last check.
+    """
+    if not archive_pending():
+        return tasks
+
+    delay = int(settings['archive_delay'])
+    to_stay, to_go, earliest = partition_done(tasks, delay)
+    if to_go:
+        with list_lock():
+            # left for next time if the list was written since it was read
+            if list_version() != loaded['version']:
+                return tasks
+            archive_tasks(to_go)
+            write_tasks(to_stay)
+    task_store().remember_done(earliest)
+    return to_stay
+
+
+def archive_pending():
+    """check if any task may be due for automatic archiving"""
+    cutoff = (utils.today() -
+              datetime.timedelta(int(settings['archive_delay'])))
+    return task_store().done_before(cutoff)
+
+
 def archive_all(tasks):
     tasks = archive_done(tasks, 0)
     return tasks
 
 
 def shellmode(args):
-    while True:
-        try:
-            os.system('clear')
-            handle_view_commands(args[:])
-            commands = input("Input Command: ")
-            if commands == '':
+    """
+    print a view of the list and prompt for action commands, until an empty
+    line is entered.
+
+    the list is read once and kept in memory, with commands applied to it
+    and written behind, see WriteBehind. the view is only worked out and
+    printed again when the list changes, through a command or by another
+    process.
+    """
+    args += settings['default_view'].split(',')
+    command_list = make_command_list(args, view_commands)
+    print_command, color, exclusions = print_options(command_list)
+    actions.line_editing()
+    tasks = collect_tasks()
+    writer = WriteBehind(loaded['version'])
+    changed = True
+    try:
+        while True:
+            if changed:
+                views.clear_screen()
+                print_command(execute_command_list(tasks, command_list,
+                                                   view_commands),
+                              color, exclusions)
+            for args in writer.take_failed():
+                print("Error: '{}' could not be written".format(
+                    ' '.join(args)))
+            commands = read_command(writer)
+            if commands is None:
+                tasks = writer.reread()
+                changed = True
+            elif commands == '':
                 print("Shell mode exited")
                 break
             else:
-                handle_action_commands(commands.split(' '))
-        except:
-            time.sleep(1)
-            continue
+                try:
+                    tasks = shell_action(writer, tasks, commands.split(' '))
+                except Exception:
+                    # the error has been printed. the list in memory may
+                    # have been partly changed, so it is read again.
+                    tasks = writer.reread()
+                    changed = False
+                    continue
+                tasks = settle_tasks(tasks)
+                changed = True
+    finally:
+        writer.close()
+
+
+def shell_action(writer, tasks, args):
+    """
+    apply a line of action commands in shell mode, returning the tasks.
+    commands that prompt are written at once, to the list as it is.
+    """
+    if prompting_commands.intersection(args):
+        writer.flush()
+        tasks = handle_action_commands(args)
+        writer.reread(tasks)
+        return tasks
+    args, texts = pin_target(tasks, args)
+    tasks = apply_action_commands(tasks, args[:])
+    new = [t for t in tasks if t.uid is None]
+    assign_ids(tasks)
+    # the writer gives the tasks added the same ids, whatever the lines
+    # written with it, and checks the target is the task shown
+    writer.submit(args, [t.uid for t in new], texts)
+    return tasks
+
+
+def settle_tasks(tasks):
+    """
+    order and number tasks, once changed, as they will be read back when
+    written
+    """
+    # tasks are stored with their position as their order tag
+    for i, t in enumerate(tasks):
+        t.order = i+1
+    tasks = sort_tasks(tasks)
+    for i, t in enumerate(tasks):
+        t.num = i+1
+    return tasks
+
+
+def read_command(writer):
+    """
+    prompt for a line of commands. returns None instead if the list is
+    written by another process, seen as a change of its version, before a
+    line is entered.
+    """
+    import select
+    print("Input Command: ", end='', flush=True)
+    writer.wait_for_input(True)
+    try:
+        while not select.select([sys.stdin], [], [], 1)[0]:
+            if writer.stale():
+                return None
+        return input()
+    finally:
+        writer.wait_for_input(False)
+
+
+class WriteBehind(object):
+    """
+    writes the list in a background thread, after lines of action commands
+    have been applied to it in memory, so that the prompt doesn't wait for
+    the list to be written.
+
+    each line is recorded in a journal, synced to disk, before it is taken
+    as done. the thread writes while the shell waits for input, not to slow
+    the prompt down, and the lines that come in meanwhile are written
+    together. it applies the lines again to a copy of the list of its own,
+    which is read again if another process writes the list. journals left
+    by a process that ended before writing them are written by the next
+    command, see recover_journals.
+    """
+
+    def __init__(self, version):
+        import journal
+        import threading
+        self.journal = journal.Journal(journal_path(os.getpid()))
+        self.journal.open()
+        # the version of the list the tasks in memory reflect, or None if
+        # another process has written it
+        self.version = version
+        self.tasks = None
+        self.entries = 0
+        self.pending = []
+        self.failed = []
+        self.busy = False
+        self.closed = False
+        self.idle = False
+        self.flushing = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, args, uids, texts):
+        """
+        record a line of commands applied in memory, to be written, with the
+        ids given to the tasks it added and the texts of the tasks it was
+        pinned to, see pin_target
+        """
+        with self.condition:
+            self.entries += 1
+            self.journal.record(entry=self.entries, args=args)
+            self.pending.append((self.entries, args, uids, texts))
+            self.condition.notify_all()
+
+    def flush(self):
+        """wait until every line submitted has been written"""
+        with self.condition:
+            self.flushing += 1
+            self.condition.notify_all()
+            while self.pending or self.busy:
+                self.condition.wait()
+            self.flushing -= 1
+
+    def wait_for_input(self, idle):
+        """note whether the shell is waiting for input"""
+        with self.condition:
+            self.idle = idle
+            self.condition.notify_all()
+
+    def stale(self):
+        """check if the list has been written by another process"""
+        with self.condition:
+            return (not self.pending and not self.busy and
+                    list_version() != self.version)
+
+    def reread(self, tasks=None):
+        """
+        return the list as it now is, once the lines submitted are written.
+        tasks is the list if it was just read and written in this process.
+        """
+        self.flush()
+        if tasks is None:
+            tasks = collect_tasks()
+        self.version = loaded['version']
+        self.tasks = None
+        return tasks
+
+    def take_failed(self):
+        """return the lines that failed to be written, and forget them"""
+        with self.condition:
+            failed, self.failed = self.failed, []
+        return failed
+
+    def close(self):
+        """write the lines left and stop, removing the journal"""
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.journal.remove()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.closed and not (
+                        self.pending and (self.idle or self.flushing)):
+                    self.condition.wait()
+                if self.closed:
+                    return
+                entries, self.pending = self.pending, []
+                self.busy = True
+            try:
+                self.write(entries)
+            except Exception:
+                # left in the journal, to be written by the next command
+                with self.condition:
+                    self.failed.extend(entry[1] for entry in entries)
+                    self.version = None
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def write(self, entries):
+        with list_lock():
+            current = self.version is not None
+            if self.tasks is None or list_version() != self.version:
+                self.tasks = collect_tasks()
+                current = current and loaded['version'] == self.version
+            tasks = self.tasks
+            highest_id = 0
+            used = {t.uid for t in tasks}
+            for i, (_, args, uids, texts) in enumerate(entries):
+                if i:
+                    tasks = settle_tasks(tasks)
+                try:
+                    if not check_pinned(tasks, texts):
+                        raise KeyError(args)
+                    tasks = apply_action_commands(tasks, list(args),
+                                                  batch_commands)
+                except Exception:
+                    with self.condition:
+                        self.failed.append(args)
+                    current = False
+                    continue
+                # the tasks added get the ids the shell gave them. if the
+                # line added others, or the ids were taken meanwhile, the
+                # shell reads the list again
+                new = [t for t in tasks if t.uid is None]
+                if len(new) == len(uids) and used.isdisjoint(uids):
+                    for t, uid in zip(new, uids):
+                        t.uid = uid
+                        highest_id = max(highest_id, base62.decode(uid))
+                    used.update(uids)
+                else:
+                    current = False
+            self.journal.record(intent=entries[-1][0], digest=store_digest())
+            write_tasks(tasks, highest_id)
+            sync_store()
+            self.journal.record(written=entries[-1][0])
+            self.tasks = settle_tasks(tasks)
+            with self.condition:
+                if not self.pending:
+                    self.journal.clear()
+                # the tasks in memory are read again unless they were
+                # written as they are
+                self.version = loaded['version'] if current else None
+
+
+def journal_path(pid):
+    """return the path of the journal of a shell mode process"""
+    return cache.cache_location(store_path(), 'journal.{}'.format(pid))
+
+
+def store_digest():
+    """return the digest of the file the list is stored in"""
+    import hashlib
+    try:
+        with open(store_path(), 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def sync_store():
+    """make sure what was written to the list is on disk"""
+    location = store_path()
+    for path, flags in ((location, os.O_RDONLY),
+                        (os.path.dirname(location) or '.', os.O_RDONLY)):
+        fd = os.open(path, flags)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def recover_journals():
+    """
+    write the lines of commands left in the journals of shell mode
+    processes that ended before writing them
+    """
+    # looked for without loading journal, as they are rarely there
+    head, prefix = os.path.split(journal_path(''))
+    try:
+        names = os.listdir(head or '.')
+    except OSError:
+        return
+    if not any(name.startswith(prefix) for name in names):
+        return
+    import journal
+    for left in journal.orphans(journal_path('*')):
+        with list_lock():
+            lines = left.unwritten(store_digest)
+            if lines:
+                tasks = collect_tasks()
+                for i, args in enumerate(lines):
+                    if i:
+                        tasks = settle_tasks(tasks)
+                    try:
+                        tasks = apply_action_commands(tasks, list(args),
+                                                      batch_commands)
+                    except Exception:
+                        print("Error: '{}' could not be written".format(
+                            ' '.join(args)))
+                write_tasks(tasks)
+                sync_store()
+            left.remove()
 
 view_commands = collections.OrderedDict([
     ('bc', (views.view_by_context, False)),
@@ -142,6 +1149,7 @@ view_commands = collections.OrderedDict([
     ('today', (views.view_today, False)),
     ('week', (views.view_week, False)),
     ('until', (views.view_until_cli, True)),
+    ('limit', (views.view_limit, True)),
     ('reverse', (views.view_reversed, False)),
     ('hide', ('hide', True)),
     ('nocolor', ('nocolor', False)),
@@ -175,6 +1183,37 @@ action_commands = collections.OrderedDict([
     ('rm', (actions.remove, False)),
     ])
 
+# predicates of the views that keep or drop each task on its own, without
+# reordering the list. consecutive filter views are tried in this order, in
+# a single pass, see filter_predicates_of. tags are cheapest to check,
+# dates dearest as they are decoded first.
+filter_predicates = collections.OrderedDict([
+    ('vc', views.has_contexts),
+    ('vp', views.has_projects),
+    ('any', views.text_any),
+    ('all', views.text_all),
+    ('excl', views.text_none),
+    ('today', views.due_today),
+    ('week', views.due_this_week),
+    ('until', views.due_until_code),
+    ])
+
+filter_views = set(filter_predicates)
+
+# the last due date kept by each filter view on due dates
+due_cutoffs = {
+    'today': utils.today,
+    'week': lambda: utils.today() + datetime.timedelta(7),
+    'until': utils.code_to_datetime,
+    }
+
+# views that can be applied to tasks as they are printed, see stream_tasks
+streamed_views = filter_views | {'next', 'limit'}
+streamed_prints = {views.normal_print, views.date_headers}
+
+# views that can look tasks up in an index.TaskIndex
+indexed_views = {'bc', 'bp', 'vc', 'vp', 'any', 'all', 'excl'}
+
 general_commands = collections.OrderedDict([
     ('catch', (actions.catch)),
     ('archive', (archive_all)),
@@ -203,20 +1242,58 @@ def make_command_list(args, commands):
     return command_list
 
 
-def execute_command_list(tasks, command_list, commands):
-    for command, args in command_list:
-        if args:
+def execute_command_list(tasks, command_list, commands, task_index=None):
+    i = 0
+    while i < len(command_list):
+        command, args = command_list[i]
+        run = filter_run(command_list[i:]) if commands is view_commands else 0
+        if run > 1:
+            tasks = list(views.filter_all(
+                tasks, filter_predicates_of(command_list[i:i+run])))
+            i += run
+            continue
+        if task_index is not None and command in indexed_views:
+            tasks = commands[command][0](tasks, *args, index=task_index)
+        elif args:
             tasks = commands[command][0](tasks, *args)
         else:
             tasks = commands[command][0](tasks)
+        i += 1
     return tasks
 
 
-def execute_view_command_list(command_list):
-    """executes functions corresponding to view commands"""
+def filter_run(command_list):
+    """return the number of filter views command_list starts with"""
+    run = 0
+    while run < len(command_list) and command_list[run][0] in filter_views:
+        run += 1
+    return run
+
+
+def filter_predicates_of(command_list):
+    """return the predicates of a run of filter views, cheapest first"""
+    order = list(filter_predicates)
+    command_list = sorted(command_list, key=lambda c: order.index(c[0]))
+    return [filter_predicates[command](*args)
+            for command, args in command_list]
+
+
+def index_tasks(tasks, command_list):
+    """return an index of tasks if any of the commands can use one"""
+    if any(command in indexed_views for command, _ in command_list):
+        return index.TaskIndex(tasks)
+    return None
+
+
+def print_options(command_list):
+    """
+    remove the commands setting how tasks are printed from command_list and
+    return the print function, whether to color and the hidden components.
+    task ids are hidden unless show_ids is set.
+    """
     print_command = views.normal_print
     color = True
-    exclusions = []
+    exclusions = [] if settings['show_ids'] == 'true' else ['id']
     i = 0
     x = len(command_list)
     while i < x:
@@ -232,12 +1309,89 @@ def execute_view_command_list(command_list):
             x -= 1
         else:
             i += 1
+    return print_command, color, exclusions
 
-    tasks = collect_tasks()
-    tasks = execute_command_list(tasks, command_list, view_commands)
+
+def execute_view_command_list(command_list):
+    """executes functions corresponding to view commands"""
+    print_command, color, exclusions = print_options(command_list)
+    streamed = (print_command in streamed_prints and
+                all(command in streamed_views for command, _ in command_list))
+    tasks = select_tasks(command_list)
+    if tasks is None and streamed:
+        tasks = stream_list()
+    if tasks is None:
+        tasks = collect_tasks()
+    if streamed:
+        tasks = stream_tasks(tasks, command_list)
+    else:
+        tasks = execute_command_list(tasks, command_list, view_commands,
+                                     index_tasks(tasks, command_list))
     print_command(tasks, color, exclusions)
 
 
+def stream_list():
+    """
+    return the tasks of the list in list order, built as they are printed,
+    or None if the list has to be loaded in full first
+    """
+    if (settings['archive_automatically'] == 'true' and
+            archive_pending()):
+        return None
+    return task_store().stream()
+
+
+def stream_tasks(tasks, command_list):
+    """
+    apply filter views, 'next' and 'limit' lazily, so tasks are printed as
+    they get through and nothing more is done once enough are printed
+    """
+    tasks = iter(tasks)
+    i = 0
+    while i < len(command_list):
+        run = filter_run(command_list[i:])
+        if run:
+            tasks = views.filter_all(
+                tasks, filter_predicates_of(command_list[i:i+run]))
+            i += run
+            continue
+        command, args = command_list[i]
+        tasks = itertools.islice(tasks, 1 if command == 'next'
+                                 else int(args[0]))
+        i += 1
+    return tasks
+
+
+def select_tasks(command_list):
+    """
+    have the store apply the leading filter views, and a following 'next'
+    or 'limit', without loading the whole list.
+
+    the executed commands are removed from command_list. returns None, and
+    leaves command_list as is, if the store can't select tasks itself.
+    """
+    if (settings['archive_automatically'] == 'true' and
+            archive_pending()):
+        return None
+    filters = 0
+    while (filters < len(command_list) and
+           command_list[filters][0] in filter_views):
+        filters += 1
+    limit = None
+    executed = filters
+    if executed < len(command_list):
+        command, args = command_list[executed]
+        if command in ('next', 'limit'):
+            limit = int(args[0]) if args else 1
+            executed += 1
+    if not executed:
+        return None
+    tasks = task_store().select(command_list[:filters], limit)
+    if tasks is not None:
+        del command_list[:executed]
+    return tasks
+
+
 def handle_view_commands(args):
     """
     command coordinating collecting and executing view commands
@@ -247,6 +1401,167 @@ def handle_view_commands(args):
     execute_view_command_list(command_list)
 
 
+def handle_archive_commands(args):
+    """
+    print archived tasks: an optional year, month, day or range of them,
+    followed by view commands
+    """
+    store = archive_store()
+    if args and args[0] == 'import':
+        with list_lock():
+            count = store.import_file(archive_path())
+        print('Imported {} archived tasks'.format(count))
+        return
+    start = end = None
+    if args and args[0][:1].isdigit():
+        import archive
+        start, end = archive.date_range(args.pop(0))
+    args += settings['default_view'].split(',')
+    command_list = make_command_list(args, view_commands)
+    print_command, color, exclusions = print_options(command_list)
+
+    # only read the segments holding the projects and contexts viewed
+    wanted = {command: args[0].split(' ') for command, args in command_list
+              if command in ('vp', 'vc')}
+    tasks = store.query(start, end, wanted.get('vp'), wanted.get('vc'))
+    tasks = execute_command_list(tasks, command_list, view_commands,
+                                 index_tasks(tasks, command_list))
+    print_command(tasks, color, exclusions)
+
+
+def print_archive_report(args):
+    """print counts of archived tasks for an optional date range"""
+    start = end = None
+    if args:
+        import archive
+        start, end = archive.date_range(args[0])
+    months, projects, contexts = archive_store().report(start, end)
+    print('Done: {}'.format(sum(months.values())))
+    for title, counts, form in (('By month', months, '{}'),
+                                ('By project', projects, '+{}'),
+                                ('By context', contexts, '@{}')):
+        if counts:
+            print(title)
+        for name, count in sorted(counts.items()):
+            print('  {:<20}{:>6}'.format(form.format(name), count))
+
+
+# days shown by a done report without a date range, ending today
+stats_days = 7
+
+# open tasks are counted by age in days up to each bound, and older
+stats_ages = [7, 28, 91, 365]
+stats_age_names = ['under a week', '1 to 4 weeks', '1 to 3 months',
+                   '3 to 12 months', 'over a year', 'no added date']
+
+
+def stats_table():
+    """
+    return the list as a table.TaskTable, from its table when it can be
+    had and from its tasks otherwise
+    """
+    tasks = list_table()
+    if tasks is None:
+        tasks = table.TaskTable([t.fields()
+                                 for t in collect_tasks(ordered=False)])
+    return tasks
+
+
+def archived_days(start, end):
+    """
+    return the number of archived tasks done each day between start and
+    end, by date string, from the counts kept beside the archive
+    """
+    import archive
+    if settings['archive_segments'] == 'true':
+        return archive_store().done_days(start, end)
+    return archive.file_done_days(archive_path(), start, end)
+
+
+def print_done_stats(tasks, args):
+    """
+    print the number of tasks done each day in the list and the archive,
+    over a date range or the last stats_days days
+    """
+    import archive
+    if args:
+        start, end = archive.date_range(args[0])
+    else:
+        end = utils.today()
+        start = end - datetime.timedelta(stats_days - 1)
+    days = archive.in_range(
+        {datetime.date.fromordinal(day).isoformat(): count
+         for day, count in tasks.done_days().items()}, start, end)
+    days.update(archived_days(start, end))
+    print('Done: {}'.format(sum(days.values())))
+    for day, count in sorted(days.items()):
+        print('  {:<20}{:>6}'.format(day, count))
+
+
+def print_overdue_stats(tasks, args):
+    """print the number of unfinished tasks past their due date by project"""
+    rows = tasks.due_before(utils.today())
+    print('Overdue: {}'.format(len(rows)))
+    for name, count in sorted(tasks.counts('projects', rows).items()):
+        print('  {:<20}{:>6}'.format('+' + name, count))
+
+
+def print_age_stats(tasks, args):
+    """print the number of unfinished tasks by the time since they were added"""
+    counts = tasks.ages(utils.today(), stats_ages)
+    print('Open: {}'.format(sum(counts)))
+    for name, count in zip(stats_age_names, counts):
+        print('  {:<20}{:>6}'.format(name, count))
+
+
+stats_reports = collections.OrderedDict([
+    ('done', print_done_stats),
+    ('overdue', print_overdue_stats),
+    ('age', print_age_stats),
+    ])
+
+
+def print_stats(args):
+    """
+    print reports on the list and the archive: tasks done per day, overdue
+    tasks per project and open tasks by age. a report name prints only that
+    report, and done takes an optional date range.
+    """
+    names = list(stats_reports) if not args else args[:1]
+    for name in names:
+        if name not in stats_reports:
+            print('Error: {} is not a report'.format(name))
+            return
+    tasks = stats_table()
+    for name in names:
+        stats_reports[name](tasks, args[1:])
+
+
+def import_list(location):
+    """add the tasks of a todo.txt file to the list"""
+    with open(location) as f:
+        imported = [parse.Task(l) for l in f if l.strip()]
+
+    def add_imported(tasks):
+        uids = {t.uid for t in tasks}
+        for t in imported:
+            # ids already in use are replaced
+            if t.uid in uids:
+                t.uid = None
+            uids.add(t.uid)
+            tasks.append(t)
+        return tasks
+
+    update_tasks(add_imported)
+
+
+def export_list(location):
+    """write the list to a todo.txt file"""
+    with open(location, 'w') as f:
+        for i, t in enumerate(collect_tasks()):
+            f.write(t.compose_line(False, ['n'], i+1) + '\n')
+
+
 def extract_addition(args):
     text = []
     while args:
@@ -285,25 +1600,82 @@ def execute_action_command_list(command_list, target, lines):
     return lines
 
 
-def handle_action_commands(args):
-    """coordinates receiving, parsing, executing action commands"""
-    tasks = collect_tasks()
+def handle_action_commands(args, tasks=None):
+    """
+    coordinates receiving, parsing, executing action commands. returns the
+    tasks written, see update_tasks.
+    """
+    if not prompting_commands.intersection(args):
+        return update_tasks(
+            lambda tasks: apply_action_commands(tasks, args[:]), tasks=tasks)
+
+    texts = {}
+
+    def apply_pinned(tasks):
+        # applied again if the list is written meanwhile, when the number
+        # may belong to another task
+        if not check_pinned(tasks, texts):
+            print('Error: the task was changed meanwhile')
+            raise KeyError(args)
+        args[:], pinned = pin_target(tasks, args)
+        texts.update(pinned)
+        return apply_action_commands(tasks, args[:])
+
+    return update_tasks(apply_pinned, True, tasks)
+
+
+def pin_target(tasks, args):
+    """
+    replace the number of the target task in args by its id. returns the
+    args and the text of the task pinned, by its id, see check_pinned.
+    """
+    if args[0] == 'add' or any(a.startswith('#') for a in args):
+        return args, {}
+    # the target is the first number, as found by apply_action_commands
+    for i, arg in enumerate(args):
+        if arg.isdigit():
+            num = int(arg) - 1
+            if 0 <= num < len(tasks) and tasks[num].uid is not None:
+                t = tasks[num]
+                return args[:i] + ['#' + t.uid] + args[i+1:], {t.uid: t.text}
+            break
+    return args, {}
+
+
+def check_pinned(tasks, texts):
+    """
+    check that the tasks pinned by pin_target still have the text they had
+    when their numbers were given, so that an id that came to name another
+    task doesn't change it
+    """
+    if texts:
+        for t in tasks:
+            if t.uid in texts and texts[t.uid] != t.text:
+                return False
+    return True
+
+
+def apply_action_commands(tasks, args, commands=action_commands):
+    """parse and execute one line of action commands, returning the tasks"""
     addition = None
 
     #  grab addition if exists
     if args[0] == 'add':
         args.pop(0)
         args, addition = extract_addition(args)
+        args = ids_to_numbers(tasks, args)
         target = len(tasks)
-    # or pop first element off as target if is digit
-    elif args[0].isdigit():
-        target = int(args.pop(0)) - 1
-    # if the first arg is neither a target nor "add", the next int
-    # has to be the target
     else:
-        args, target = extract_target(args)
+        args = ids_to_numbers(tasks, args)
+        # or pop first element off as target if is digit
+        if args[0].isdigit():
+            target = int(args.pop(0)) - 1
+        # if the first arg is neither a target nor "add", the next int
+        # has to be the target
+        else:
+            args, target = extract_target(args)
 
-    command_list = make_command_list(args, action_commands)
+    command_list = make_command_list(args, commands)
 
     # add the target into the arg list of every command
     if target is not None:
@@ -317,22 +1689,206 @@ def handle_action_commands(args):
         tasks = actions.add(tasks, addition)
 
     try:
-        tasks = execute_command_list(tasks, command_list, action_commands)
+        tasks = execute_command_list(tasks, command_list, commands)
+    except IndexError:
+        print("Error: task number is invalid")
+        raise
+    return tasks
+
+
+def ids_to_numbers(tasks, args):
+    """replace task ids given as '#id' in args by the tasks' numbers"""
+    wanted = {a[1:] for a in args if a.startswith('#')}
+    if not wanted:
+        return args
+    numbers = {'#' + t.uid: str(i+1) for i, t in enumerate(tasks)
+               if t.uid in wanted}
+    return [numbers.get(a, a) for a in args]
+
+
+# action commands that change nothing but the task they are given, and
+# don't prompt for input
+single_task_commands = {'undo', 'sc', 'usc', 'pr', 'upr', 'c', 'uc', 'ucn',
+                        'p', 'up', 'upn', 'con', 'exp', 'rep', 'urep', 'do'}
+
+
+def act_by_id(args):
+    """
+    apply action commands given a task id, as in 'do #3fA', to the line of
+    that task alone, found through line_ids, without reading or sorting
+    the rest of the list.
+
+    returns False, having changed nothing, if the commands need the whole
+    list.
+    """
+    uids = [a for a in args if a.startswith('#')]
+    if settings['storage'] != 'text' or args[0] == 'add' or len(uids) != 1:
+        return False
+    command_list = make_command_list([a for a in args if a != uids[0]],
+                                     action_commands)
+    if not all(command in single_task_commands
+               for command, _ in command_list):
+        return False
+    with list_lock():
+        return act_on_line(uids[0][1:], command_list)
+
+
+def act_on_line(uid, command_list):
+    """apply a command list to the line holding a task id, see act_by_id"""
+    lines = line_ids()
+    location = lines.get(uid)
+    if location is None:
+        return False
+
+    offset, length = location
+    with open(list_path(), 'rb') as f:
+        f.seek(offset)
+        line = f.read(length)
+    import locale
+    t = parse.Task(line.decode(locale.getpreferredencoding(False)))
+    # finishing a subtask tidies its parent, found elsewhere in the list
+    if (t.uid != uid or t.order is None or t.parent_id is not None or
+            t.child_id is not None):
+        return False
+
+    for _, command_args in command_list:
+        command_args.insert(0, 0)
+    try:
+        tasks = execute_command_list([t], command_list, action_commands)
     except IndexError:
         print("Error: task number is invalid")
         raise
 
-    write_tasks(tasks)
+    # a finished repeating task leaves a done copy, added after the list
+    appended = tasks[1:]
+    first = first_uid(lines) if appended else 0
+    for i, new in enumerate(appended):
+        new.uid = base62.encode(first + i)
+    line = encode_line(t, t.order)
+    added = [encode_line(new, t.order) for new in appended]
+    end = list_stamp()[1]
+    if added and end and not ends_with_newline():
+        return False
+    patch_list([(offset, length, line)], added)
+    list_lock().written(first + len(appended) - 1 if appended else 0)
+    drop_vocabulary()
+
+    # move the lines after the patched one rather than indexing anew
+    shift = len(line) - length
+    if shift:
+        for key, location in lines.items():
+            if location is not None and location[0] > offset:
+                lines[key] = (location[0] + shift, location[1])
+        lines[uid] = (offset, len(line))
+    end += shift
+    for new, new_line in zip(appended, added):
+        lines[new.uid] = (end, len(new_line))
+        end += len(new_line)
+    id_index['stamp'] = list_version()
+    cache.save_marker(list_path(), 'ids', id_index['stamp'], lines)
+    return True
+
+
+# action commands that prompt for input
+prompting_commands = {'edit', 'rm'}
+
+# action commands of a batch, leaving out those that prompt for input
+batch_commands = collections.OrderedDict(
+    (command, action) for command, action in action_commands.items()
+    if command not in prompting_commands)
+
+
+def batch(lines):
+    """
+    apply lines of action commands to the list, reading and writing it only
+    once. a line is a string, split as a shell would, or a list of
+    arguments. blank lines and lines starting with '#' are skipped.
+
+    task numbers refer to the list as it was read, so they can be taken from
+    a single listing. tasks added by the batch are numbered after it, in the
+    order they are added. only setabove and setbelow move tasks, shifting
+    the numbers between the two positions as usual. lines that fail are
+    reported and skipped, and their numbers, counted from 1, are returned.
+    a line failing part way keeps the changes of the commands before the
+    failure. edit and rm, which prompt, are not available.
+    """
+    import shlex
+    load_settings()
+    lines = list(lines)
+    failed = []
+
+    def apply_lines(tasks):
+        for number, line in enumerate(lines, 1):
+            try:
+                if type(line) is str:
+                    if line.lstrip().startswith('#'):
+                        continue
+                    line = shlex.split(line)
+                if not line:
+                    continue
+                tasks = apply_action_commands(tasks, list(line),
+                                              batch_commands)
+            except Exception:
+                print('Error: line {} failed'.format(number))
+                failed.append(number)
+        return tasks
+
+    update_tasks(apply_lines)
+    sync_store()
+    return failed
+
+
+def handle_batch(args):
+    """apply the action command lines of a file, or of stdin"""
+    if args and args[0] != '-':
+        with open(args[0]) as f:
+            failed = batch(f)
+    else:
+        failed = batch(sys.stdin)
+    if failed:
+        sys.exit(1)
 
 
 def handle_general_commands(arg):
     """coordinate collecting tasks, executing the command, and writing tasks"""
-    tasks = collect_tasks()
-    tasks = general_commands[arg](tasks)
-    write_tasks(tasks)
+    update_tasks(general_commands[arg], arg == 'catch')
+
+
+def run_captured(args, columns=None, lines=None):
+    """run a command for a server client, returning what it printed"""
+    for name, value in (('COLUMNS', columns), ('LINES', lines)):
+        if value:
+            os.environ[name] = str(value)
+        else:
+            os.environ.pop(name, None)
+    import contextlib
+    import traceback
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            main(args)
+        except SystemExit:
+            pass
+        except Exception:
+            traceback.print_exc(file=output)
+    return output.getvalue()
+
+
+def serve():
+    """keep the list in memory and answer commands sent by client.py"""
+    import server
+    keep_resident()
+    server.serve(run_captured, keep_resident)
+
+
+def load_settings():
+    """read config.rc, or write it with the defaults if there is none"""
+    settings.update(config.process_config(__location__, dict(defaults)))
 
 
 def main(args):
+    load_settings()
+    recover_journals()
     if len(args) == 0:
         args = settings['default_command'].split(' ')
     if args[0] in view_commands.keys():
@@ -340,9 +1896,11 @@ def main(args):
             handle_view_commands(args)
         except:
             sys.exit()
-    elif args[0] in action_commands.keys() or args[0].isdigit():
+    elif (args[0] in action_commands.keys() or args[0].isdigit() or
+          args[0].startswith('#')):
         try:
-            handle_action_commands(args)
+            if not act_by_id(args):
+                handle_action_commands(args)
         except:
             sys.exit()
     elif args[0] in general_commands.keys():
@@ -351,8 +1909,39 @@ def main(args):
         print_projects()
     elif args[0] == 'pc':
         print_contexts()
+    elif args[0] == 'complete':
+        print_completions(args[1:])
     elif args[0] == 'shell':
         shellmode(args[1:])
+    elif args[0] == 'serve':
+        serve()
+    elif args[0] == 'batch':
+        try:
+            handle_batch(args[1:])
+        except OSError as e:
+            print('Error: {}'.format(e))
+    elif args[0] in ('import', 'export') and len(args) == 2:
+        try:
+            (import_list if args[0] == 'import' else export_list)(args[1])
+        except OSError as e:
+            print('Error: {}'.format(e))
+    elif args[0] == 'arc':
+        try:
+            handle_archive_commands(args[1:])
+        except ValueError:
+            print('Error: not a valid date range')
+        except (KeyError, IndexError):
+            sys.exit()
+    elif args[0] == 'arcr':
+        try:
+            print_archive_report(args[1:])
+        except ValueError:
+            print('Error: not a valid date range')
+    elif args[0] == 'stats':
+        try:
+            print_stats(args[1:])
+        except ValueError:
+            print('Error: not a valid date range')
     else:
         print('Error: {} is not a valid command'.format(args[0]))
 
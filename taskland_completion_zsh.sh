@@ -1,5 +1,9 @@
 #compdef tdp
 executable="/path/to/your/taskland.py"
+# the list file (todo.db with storage=sqlite), and the vocabulary of
+# completions taskland keeps beside it
+list="${executable:h}/todo.txt"
+vocabulary="${list:h}/.${list:t}.words"
 
 view_cmds=(
     'bc:View tasks organized by context'
@@ -13,6 +17,7 @@ view_cmds=(
     'today:view tasks due up to and including today'
     'week:View tasks due up to and including a week from today'
     'until:View tasks due up to and including a given date'
+    'limit:View only the first N tasks'
     'reverse:View tasks in reverse order'
     "hide:Don't show components of tasks signified by the following codes"
     'nocolor:Pretty-print tasks with color-coded components'
@@ -78,22 +83,42 @@ _hide_flags() {
     _describe -t commands 'tdp command' commands "$@"
 }
 
+# read the completions of a kind, by its letter, from the vocabulary into
+# reply, without starting taskland unless the list changed since
+_vocabulary() {
+    if [[ ! -f $vocabulary || $list -nt $vocabulary ]]; then
+        ${executable} complete > /dev/null
+    fi
+    local lines; lines=( "${(@f)$(<$vocabulary)}" )
+    reply=( ${${(M)lines:#$1 *}#$1 } )
+}
+
 _get_projects() {
-    local completions
-    completions="$(${executable} pp)"
-    completions=( "${(ps:\n:)completions}" )
-    _describe -t completions 'projects' completions "$@"
+    local reply
+    _vocabulary p
+    _describe -t completions 'projects' reply "$@"
 }
 
 _get_contexts() {
-    local completions
-    completions="$(${executable} pc)"
-    completions=( "${(ps:\n:)completions}" )
-    _describe -t completions 'projects' completions "$@"
+    local reply
+    _vocabulary c
+    _describe -t completions 'contexts' reply "$@"
+}
+
+_get_tasks() {
+    local reply
+    _vocabulary n
+    _describe -t completions 'tasks' reply "$@"
+}
+
+_get_parents() {
+    local reply
+    _vocabulary s
+    _describe -t completions 'parent tasks' reply "$@"
 }
 
 assess_mode() {
-    commands=(bc bp vc vp any all excl next today week until reverse trim nocolor nest h)
+    commands=(bc bp vc vp any all excl next today week until limit reverse trim nocolor nest h)
     for c in "${commands[@]}"; do
         if [ "$c" = "$1" ]; then
             _arguments '*: :_view_cmds'
@@ -118,7 +143,11 @@ else
 fi
 case "$keyword" in
     taskland)
-        _arguments '*: :_all_cmds'
+        if [ $CURRENT -eq 2 ]; then
+            _alternative 'commands: :_all_cmds' 'tasks: :_get_tasks'
+        else
+            _arguments '*: :_all_cmds'
+        fi
         ret=0
         ;;
     p|vp)
@@ -129,6 +158,14 @@ case "$keyword" in
         _arguments '*: :_get_contexts'
         ret=0
         ;;
+    sub)
+        _arguments '*: :_get_parents'
+        ret=0
+        ;;
+    setabove|setbelow)
+        _arguments '*: :_get_tasks'
+        ret=0
+        ;;
     trim)
         _arguments '*: :_trim_flags'
         ret=0
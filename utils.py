@@ -1,11 +1,23 @@
 #!/usr/bin/python
 """general utility functions that don't fit thematically elsewhere"""
 import datetime
+import time
 import re
 
 
 weekdays = ['m', 't', 'w', 'r', 'f', 's', 'u']
 
+day_re = re.compile(r'\d{1,2}$')
+month_day_re = re.compile(r'\d{1,2}-\d{1,2}$')
+full_date_re = re.compile(r'\d{4}-\d{1,2}-\d{1,2}$')
+
+# today's date and the time it ends at, see today
+current_day = {'ends': 0}
+
+# dates that date codes were resolved to today, by code, see
+# code_to_datetime
+resolved_codes = {}
+
 
 def projects_get(tasks):
     """return list of all projects in list"""
@@ -19,29 +31,49 @@ def contexts_get(tasks):
                   key=lambda s: s.lower())
 
 
+def today():
+    """
+    return today's date, worked out once a day rather than on every call.
+    the codes resolved on a day are forgotten when it ends.
+    """
+    if time.time() >= current_day['ends']:
+        date = datetime.date.today()
+        tomorrow = datetime.datetime.combine(date + datetime.timedelta(1),
+                                             datetime.time())
+        current_day['date'] = date
+        current_day['ends'] = tomorrow.timestamp()
+        resolved_codes.clear()
+    return current_day['date']
+
+
+def month_length(year, month):
+    """return the number of days in a month"""
+    if month == 2:
+        leap = year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+        return 29 if leap else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+
 def weekday_to_datetime(string):
     """convert a weekday code to datetime object"""
     daynum = weekdays.index(string)
-    offset = daynum - int(datetime.date.today().weekday())
+    offset = daynum - int(today().weekday())
     if offset < 1:
         offset += 7
-    date = datetime.date.today() + datetime.timedelta(offset)
+    date = today() + datetime.timedelta(offset)
     return date
 
 
 def date_to_datetime(s):
     """converts to datetime a string in various formats"""
     date = None
-    td = datetime.date.today()
+    td = today()
     td = [td.year, td.month, td.day]
-    month_lengths = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
-    if td[0] % 4 == 0:
-        month_lengths[1] = 29
-    if re.match('\d{1,2}$', s):
+    if day_re.match(s):
         year, month, day = None, None, int(s)
-    elif re.match(r'\d{1,2}-\d{1,2}$', s):
-        year, month, day = None, tuple([int(i) for i in s.split('-')])
-    elif re.match(r'\d{4}-\d{1,2}-\d{1,2}$', s):
+    elif month_day_re.match(s):
+        year, (month, day) = None, tuple([int(i) for i in s.split('-')])
+    elif full_date_re.match(s):
         year, month, day = tuple([int(i) for i in s.split('-')])
 
     # increment month if day is lower than td
@@ -53,17 +85,15 @@ def date_to_datetime(s):
     # set unset months and years
     if not month:
         month = td[1]
-    if not year:
-        year = td[0]
 
     # if month lower than td's, due next year.
-    if month < td[1]:
-        year = td[0] + 1
+    if not year:
+        year = td[0] + 1 if month < td[1] else td[0]
 
     # handle edge cases where impossible dates are entered.
     if month > 12:
         print("Error: Month must be 12 or below")
-    elif day > month_lengths[month-1]:
+    elif day > month_length(year, month):
         print("Error: Not that many days in the month")
     else:
         date = datetime.date(year, month, day)
@@ -71,34 +101,56 @@ def date_to_datetime(s):
 
 
 def code_to_datetime(string):
-    """interpret the code used with scheduling commands as a datetime object"""
+    """
+    interpret the code used with scheduling commands as a datetime object.
+    codes are resolved once a day, as a batch or a view may use the same
+    code for many tasks.
+    """
+    today()  # forgets the codes resolved on earlier days
+    if string in resolved_codes:
+        return resolved_codes[string]
     if string[0] in weekdays:
         date = weekday_to_datetime(string)
     elif string[0] == 'n':
-        date = datetime.date.today()
+        date = today()
     elif string[0].isdigit():
         date = date_to_datetime(string)
     else:
         print('Error: Not a valid date format')
+    if date is not None:
+        resolved_codes[string] = date
     return date
 
 
+colors = {
+    'red': 1,
+    'green': 2,
+    'yellow': 3,
+    'blue': 4,
+    'magenta': 13,
+    'cyan': 6,
+    'orange': 9,
+    'gray': 10,
+    'white': 14,
+    }
+
+
+def color_codes(color):
+    """return the terminal codes to put before and after a colored string"""
+    return '\x1b[38;5;{}m'.format(colors[color]), '\x1b[0m'
+
+
 def colorize(string, color):
     """surround a string with terminal color codes"""
-    colors = {
-        'red': 1,
-        'green': 2,
-        'yellow': 3,
-        'blue': 4,
-        'magenta': 13,
-        'cyan': 6,
-        'orange': 9,
-        'gray': 10,
-        'white': 14,
-        }
-    return '\x1b[38;5;{}m{}\x1b[0m'.format(colors[color], string)
+    prefix, suffix = color_codes(color)
+    return prefix + str(string) + suffix
 
 
 def string_to_datetime(string):
     """convert dd-mm-yyyy string to datetime"""
+    if len(string) == 10 and string[4] == string[7] == '-':
+        try:
+            return datetime.date.fromisoformat(string)
+        except ValueError:
+            pass
     return datetime.date(*map(int, string.split('-')))
@@ -3,59 +3,154 @@
 """functions for filtering and printing the task list"""
 
 import datetime
+import io
 import os
+import sys
 import utils
 
 
-def view_by_project(tasks):
+def group_by(tasks, values, table=None):
+    """
+    return tasks grouped by the values returned by values(task), in a
+    single pass. a task with several values appears in each group.
+
+    table may map values to positions in tasks if already built.
+    """
+    if table is None:
+        table = {}
+        for i, t in enumerate(tasks):
+            for value in values(t):
+                group = table.setdefault(value, [])
+                if not group or group[-1] != i:
+                    group.append(i)
+    return [tasks[i] for v in sorted(table, key=lambda s: s.lower())
+            for i in table[v]]
+
+
+def view_by_project(tasks, index=None):
     """return list of tasks sorted by project"""
-    return [t for p in utils.projects_get(tasks) for t in tasks
-            if p in t.projects]
+    if index is not None and index.covers(tasks):
+        return group_by(tasks, None, index.projects)
+    return group_by(tasks, lambda t: t.projects)
 
 
-def view_by_context(tasks):
+def view_by_context(tasks, index=None):
     """return list of tasks sorted by project"""
-    return [t for p in utils.contexts_get(tasks) for t in tasks
-            if p in t.contexts]
+    if index is not None and index.covers(tasks):
+        return group_by(tasks, None, index.contexts)
+    return group_by(tasks, lambda t: t.contexts)
+
+
+def has_contexts(strings):
+    """predicate on a task having any of the space separated contexts"""
+    names = set(strings.split(' '))
+    return lambda t: not names.isdisjoint(t.contexts)
+
+
+def has_projects(strings):
+    """predicate on a task having any of the space separated projects"""
+    names = set(strings.split(' '))
+    return lambda t: not names.isdisjoint(t.projects)
+
+
+def text_any(strings):
+    """predicate on a task's text including any of the strings"""
+    strings = strings.split(' ')
+    if len(strings) == 1:
+        string = strings[0]
+        return lambda t: string in t.text
+    return lambda t: any(s in t.text for s in strings)
+
+
+def text_all(strings):
+    """predicate on a task's text including all of the strings"""
+    strings = strings.split(' ')
+    return lambda t: all(s in t.text for s in strings)
+
+
+def text_none(strings):
+    """predicate on a task's text including none of the strings"""
+    included = text_any(strings)
+    return lambda t: not included(t)
+
+
+def due_until(date):
+    """predicate on a task being unfinished and due by date"""
+    return lambda t: not t.x and t.due is not None and t.due <= date
+
+
+def due_until_code(string):
+    """predicate on a task being unfinished and due by a date code"""
+    return due_until(utils.code_to_datetime(string))
 
 
-def filter_contexts(tasks, strings):
+def due_today():
+    """predicate on a task being unfinished and due by today"""
+    return due_until(utils.today())
+
+
+def due_this_week():
+    """predicate on a task being unfinished and due within a week"""
+    return due_until(utils.today()+datetime.timedelta(7))
+
+
+def filter_all(tasks, predicates):
+    """
+    return an iterator over the tasks all of predicates are true for. the
+    predicates are tried in order, in a single pass over tasks.
+    """
+    for predicate in predicates:
+        tasks = filter(predicate, tasks)
+    return tasks
+
+
+def filter_contexts(tasks, strings, index=None):
     """return list of tasks whose contexts contain any of supplied strings"""
-    return [t for t in tasks if
-            any(s in t.contexts for s in strings.split(' '))]
+    if index is not None:
+        return index.select(tasks, index.with_contexts(strings.split(' ')))
+    return list(filter(has_contexts(strings), tasks))
 
 
-def filter_projects(tasks, strings):
+def filter_projects(tasks, strings, index=None):
     """return list of tasks whose projects contian any of supplied strings"""
-    return [t for t in tasks if
-            any(s in t.projects for s in strings.split(' '))]
+    if index is not None:
+        return index.select(tasks, index.with_projects(strings.split(' ')))
+    return list(filter(has_projects(strings), tasks))
 
 
-def filter_include_any(tasks, strings):
+def filter_include_any(tasks, strings, index=None):
     """return list of tasks whose text include any of supplied strings"""
-    return [t for t in tasks if any(s in t.text for s in strings.split(' '))]
+    if index is not None:
+        hits = set().union(*[index.containing(s) for s in strings.split(' ')])
+        return index.select(tasks, hits)
+    return list(filter(text_any(strings), tasks))
 
 
-def filter_include_all(tasks, strings):
+def filter_include_all(tasks, strings, index=None):
     """return list of tasks whose text include all of supplied strings"""
-    return [t for t in tasks if all(s in t.text for s in strings.split(' '))]
+    if index is not None:
+        hits = set.intersection(*[index.containing(s)
+                                  for s in strings.split(' ')])
+        return index.select(tasks, hits)
+    return list(filter(text_all(strings), tasks))
 
 
-def filter_exclude(tasks, strings):
+def filter_exclude(tasks, strings, index=None):
     """return list of tasks whose text include none of supplied strings"""
-    return [t for t in tasks if not
-            any(s in t.text for s in strings.split(' '))]
+    if index is not None:
+        hits = set().union(*[index.containing(s) for s in strings.split(' ')])
+        return index.exclude(tasks, hits)
+    return list(filter(text_none(strings), tasks))
 
 
 def view_until(tasks, date):
     """takes datetime object, returns all tasks up to and including date"""
-    return [t for t in tasks if t.due and t.due <= date and not t.x]
+    return list(filter(due_until(date), tasks))
 
 
 def view_until_cli(tasks, string):
     """return list of tasks that are due up until the supplied date"""
-    date = utils.code_to_datetime(string)
-    return view_until(tasks, date)
+    return list(filter(due_until_code(string), tasks))
 
 
 def view_next(tasks):
@@ -63,51 +158,109 @@ def view_next(tasks):
     return [tasks[0]] if tasks else []
 
 
+def view_limit(tasks, number):
+    """return the first number of tasks"""
+    return tasks[:int(number)]
+
+
 def view_today(tasks):
     """return list of tasks that are due up until today"""
-    return view_until(tasks, datetime.date.today())
+    return list(filter(due_today(), tasks))
 
 
 def view_week(tasks):
     """view tasks due within the coming week"""
-    return view_until(tasks, datetime.date.today()+datetime.timedelta(7))
+    return list(filter(due_this_week(), tasks))
 
 
 def view_reversed(tasks):
     """reverse order of tasks"""
-    tasks.reverse()
-    return tasks
+    return tasks[::-1]
+
+
+def write_lines(lines):
+    """
+    print lines as they are produced, through a single block buffer rather
+    than a write per line. prints an empty line if there are none.
+
+    stops asking for lines once the reader of the output has gone away,
+    as with '| head'.
+    """
+    try:
+        raw = sys.stdout.buffer
+    except AttributeError:
+        raw = None
+    if raw is None:
+        out = sys.stdout
+    else:
+        sys.stdout.flush()
+        out = io.TextIOWrapper(raw, encoding=sys.stdout.encoding,
+                               errors=sys.stdout.errors, newline='\n')
+    try:
+        empty = True
+        for line in lines:
+            out.write(line)
+            out.write('\n')
+            empty = False
+        if empty:
+            out.write('\n')
+        out.flush()
+    except BrokenPipeError:
+        # send anything still buffered nowhere, so exiting doesn't fail
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        if raw is not None:
+            out.flush()
+            out.detach()
+
+
+def clear_screen():
+    """clear the terminal and move to its top with ANSI codes"""
+    sys.stdout.write('\033[H\033[2J\033[3J')
+    sys.stdout.flush()
 
 
 def normal_print(tasks, color, exclusions):
     """print tasks using basic print method"""
-    print('\n'.join([t.compose_line(color, exclusions) for t in tasks]))
+    write_lines(t.compose_line(color, exclusions) for t in tasks)
 
 
 def nest_sort(tasks):
     """sort all children to be under their parents"""
-    parent_ids = [t.parent_id for t in tasks if t.parent_id is not None]
+    parent_ids = {t.parent_id for t in tasks if t.parent_id is not None}
     # checks for orphaned children due to invalid list or filtering
-    nest_sorted = [t for t in tasks if not t.child_id or
-                   t.child_id not in parent_ids]
-    remaining = [t for t in tasks if t not in nest_sorted]
-    i = 0
-    while len(remaining) > 0:
-        if nest_sorted[i].parent_id:
-            children = [t for t in remaining
-                        if t.child_id == nest_sorted[i].parent_id]
-            remaining = [t for t in remaining if t not in children]
-            nest_sorted = nest_sorted[:i+1] + children + nest_sorted[i+1:]
-        i += 1
+    roots = []
+    children = {}
+    for t in tasks:
+        if not t.child_id or t.child_id not in parent_ids:
+            roots.append(t)
+        else:
+            children.setdefault(t.child_id, []).append(t)
+
+    # depth first, children follow their parent in list order. only the
+    # first task with a given parent id takes its children.
+    nest_sorted = []
+    stack = roots[::-1]
+    while stack:
+        t = stack.pop()
+        nest_sorted.append(t)
+        if t.parent_id and t.parent_id in children:
+            stack.extend(reversed(children.pop(t.parent_id)))
+    if children:
+        raise IndexError('subtasks can not be placed under a parent')
     return nest_sorted
 
 
 def nest(tasks, color, trimmings):
     """print tasks in a nested format"""
 
-    tasks = nest_sort(tasks)
-    output_lines = []
+    write_lines(nest_lines(nest_sort(tasks), color, trimmings))
+
+
+def nest_lines(tasks, color, trimmings):
+    """yield the lines of nest sorted tasks, indented under their parents"""
     hierarchy = []
+    levels = {}  # position of each child id in hierarchy
     closed_id = 0
     latest_parent_id = 0
     for t in tasks:
@@ -117,19 +270,25 @@ def nest(tasks, color, trimmings):
         # manage nesting hierarchy
         indents = 0
         if t.child_id is not None:
-            if t.child_id not in hierarchy:
+            if t.child_id not in levels:
                 # necessary to check if child is orphan
                 if t.child_id == latest_parent_id:
+                    levels[t.child_id] = len(hierarchy)
                     hierarchy.append(t.child_id)
                 else:
-                    hierarchy = []
+                    hierarchy.clear()
+                    levels.clear()
                     orphan = True
             else:
-                hierarchy = hierarchy[:hierarchy.index(t.child_id)+1]
+                level = levels[t.child_id]
+                for child_id in hierarchy[level+1:]:
+                    del levels[child_id]
+                del hierarchy[level+1:]
             if not orphan:
-                indents = hierarchy.index(t.child_id)+1
+                indents = levels[t.child_id]+1
         else:
-            hierarchy = []
+            hierarchy.clear()
+            levels.clear()
 
         # closed/open indicator, set switch to hide following tasks
         # set last parent id
@@ -144,27 +303,42 @@ def nest(tasks, color, trimmings):
             prefix = ' '  # so non-parents stay lined up
 
         # if the closed_id is in the hierarchy, then the task will be hidden
-        if closed_id not in hierarchy:
-            line = '   ' * indents + prefix + t.compose_line(color, trimmings)
-            output_lines.append(line)
-
-    print('\n'.join(output_lines))
+        if closed_id not in levels:
+            yield '   ' * indents + prefix + t.compose_line(color, trimmings)
 
 
 def get_console_size():
-    """returns rows and columns as 2 tuple"""
-    return [int(i) for i in os.popen('stty size', 'r').read().split()]
+    """
+    returns rows and columns as 2 tuple. asks whichever standard stream is
+    a terminal, so output piped to a pager still gets the terminal width,
+    and falls back to 24 by 80 if none is.
+    """
+    try:
+        return [int(os.environ['LINES']), int(os.environ['COLUMNS'])]
+    except (KeyError, ValueError):
+        pass
+    for stream in (sys.__stdout__, sys.__stderr__, sys.__stdin__):
+        try:
+            size = os.get_terminal_size(stream.fileno())
+        except (AttributeError, ValueError, OSError):
+            continue
+        return [size.lines, size.columns]
+    return [24, 80]
 
 
 def date_headers(tasks, color, trimmings):
     """print lines with date headers"""
+    write_lines(header_lines(tasks, color, trimmings, get_console_size()[1]))
+
+
+def header_lines(tasks, color, trimmings, columns):
+    """yield task lines with a header of the given width above each date"""
     previous_title = ''
-    output_lines = []
     for t in tasks:
         if t.x is not None:
             title = 'Finished'
         elif t.due:
-            if t.due == datetime.date.today():
+            if t.due == utils.today():
                 title = 'Today'
             else:
                 title = t.due.strftime('%Y-%m-%d')
@@ -172,8 +346,6 @@ def date_headers(tasks, color, trimmings):
             title = 'Future'
         if title != previous_title:
             previous_title = title
-            buff = get_console_size()[1] - len(title)
-            output_lines.append('\x1b[48;5;0m{}{}\x1b[0m'
-                                .format(title, ' '*buff))
-        output_lines.append(t.compose_line(color, trimmings))
-    print('\n'.join(output_lines))
+            yield '\x1b[48;5;0m{}{}\x1b[0m'.format(
+                title, ' '*(columns - len(title)))
+        yield t.compose_line(color, trimmings)